@@ -13,8 +13,104 @@ class Config:
     REJECTIONS_VECTORSTORE_DIR = os.getenv("REJECTIONS_VECTORSTORE_DIR", "/tmp/rejections_vectorstore")
 
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    # OpenAI calls: max requests in flight in the process (also the connection pool size), timeout in seconds,
+    # and retries of rate limited / failed requests with exponential backoff (seconds) unless Retry-After is sent
+    OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+    OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "1"))
+    OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "30"))
+    # LLM provider (see services/llm_providers.py): "openai", or "fake" for an in-process stand-in answering
+    # after LLM_FAKE_LATENCY seconds + generated tokens / LLM_FAKE_TOKENS_PER_SECOND (0 = instant),
+    # failing with a rate limit error for a LLM_FAKE_ERROR_RATE share of the requests
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+    LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0.5"))
+    LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "100"))
+    LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+    LLM_FAKE_SEED = int(os.getenv("LLM_FAKE_SEED", "0"))
+    # "record" saves every answer of the provider to LLM_RECORDINGS_DIR, "replay" answers from there only
+    # (optionally waiting as long as the recorded request took), "" disables both
+    LLM_RECORD_MODE = os.getenv("LLM_RECORD_MODE", "")
+    LLM_RECORDINGS_DIR = os.getenv("LLM_RECORDINGS_DIR", "/tmp/llm_recordings")
+    LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "false").lower() == "true"
     GCS_BUCKET = os.getenv("GCS_BUCKET", None)
     GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    # Storage of the uploaded PDFs and reports (see services/storage.py): "gcs", "local" (STORAGE_LOCAL_DIR) or ""
+    # for GCS_BUCKET if set. Transfers run on STORAGE_WORKERS threads, local copies are deleted once uploaded
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "")
+    STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "/tmp/ndai_storage")
+    STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "8"))
+    STORAGE_DELETE_UPLOADED = os.getenv("STORAGE_DELETE_UPLOADED", "true").lower() == "true"
+
+    # PDF extraction: pages with fewer characters than this in their text layer are OCR'd
+    MIN_TEXT_LAYER_CHARS = int(os.getenv("MIN_TEXT_LAYER_CHARS", "20"))
+    # OCR of scanned pages: worker processes (0 = inline), rendering DPI and max pages rendered at once
+    OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+    OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+    OCR_MAX_PAGES_IN_FLIGHT = int(os.getenv("OCR_MAX_PAGES_IN_FLIGHT", "4"))
+    # Content-addressed cache of extracted pages (empty dir disables it), optionally shared through GCS_BUCKET
+    EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "/tmp/extraction_cache")
+    EXTRACTION_CACHE_MAX_MB = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "256"))
+    EXTRACTION_CACHE_GCS = os.getenv("EXTRACTION_CACHE_GCS", "false").lower() == "true"
+    # Sentence embedding model shared by the policy and rejections vectorstores
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    # Embedding backend: "torch" (sentence-transformers) or "onnx" (int8-quantized export run by onnxruntime)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/tmp/onnx_models/all-MiniLM-L6-v2")
+    ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+    # Embedding cache: in-process LRU + SQLite file on disk (empty path keeps it in memory only)
+    EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true").lower() == "true"
+    EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "4096"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/tmp/embedding_cache/embeddings.sqlite3")
+    EMBEDDING_CACHE_DISK_MAX_ITEMS = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ITEMS", "100000"))
+    # Policy rules lookup: "numpy" (in-memory exact index) or "chroma" (persistent collection)
+    POLICY_INDEX_BACKEND = os.getenv("POLICY_INDEX_BACKEND", "numpy")
+    # Keyword index built from the rules detection_hints: each distinct keyword found in a clause adds
+    # KEYWORD_HIT_BOOST to the rule's cosine similarity, for at most KEYWORD_MAX_BOOSTED_HITS keywords
+    KEYWORD_INDEX = os.getenv("KEYWORD_INDEX", "true").lower() == "true"
+    KEYWORD_HIT_BOOST = float(os.getenv("KEYWORD_HIT_BOOST", "0.05"))
+    KEYWORD_MAX_BOOSTED_HITS = int(os.getenv("KEYWORD_MAX_BOOSTED_HITS", "3"))
+    # Cache of clause LLM evaluations: "postgres" (app database), "disk" (SQLite file) or "" (disabled)
+    EVALUATION_CACHE = os.getenv("EVALUATION_CACHE", "postgres")
+    EVALUATION_CACHE_PATH = os.getenv("EVALUATION_CACHE_PATH", "/tmp/evaluation_cache/evaluations.sqlite3")
+    EVALUATION_CACHE_TTL_HOURS = float(os.getenv("EVALUATION_CACHE_TTL_HOURS", "168"))
+    # Evaluate several clauses per LLM request, in batches of at most LLM_BATCH_MAX_CLAUSES clauses
+    # and about LLM_BATCH_MAX_PROMPT_TOKENS prompt tokens
+    LLM_BATCH_MODE = os.getenv("LLM_BATCH_MODE", "false").lower() == "true"
+    LLM_BATCH_MAX_PROMPT_TOKENS = int(os.getenv("LLM_BATCH_MAX_PROMPT_TOKENS", "6000"))
+    LLM_BATCH_MAX_CLAUSES = int(os.getenv("LLM_BATCH_MAX_CLAUSES", "10"))
+    # Decide clear-cut clauses from the rules examples without the LLM (cosine similarity thresholds,
+    # see services/rule_classifier.py)
+    FAST_PATH = os.getenv("FAST_PATH", "false").lower() == "true"
+    FAST_PATH_COMPLIANT_SIMILARITY = float(os.getenv("FAST_PATH_COMPLIANT_SIMILARITY", "0.9"))
+    FAST_PATH_NON_COMPLIANT_SIMILARITY = float(os.getenv("FAST_PATH_NON_COMPLIANT_SIMILARITY", "0.9"))
+    FAST_PATH_ANTI_KEYWORD_SIMILARITY = float(os.getenv("FAST_PATH_ANTI_KEYWORD_SIMILARITY", "0.8"))
+    FAST_PATH_MARGIN = float(os.getenv("FAST_PATH_MARGIN", "0.1"))
+    # Overlap extraction, segmentation and clause evaluation instead of running them one after the other
+    STREAMING_ANALYSIS = os.getenv("STREAMING_ANALYSIS", "true").lower() == "true"
+    # POST /analyze enqueues a background job polled at /analyze/jobs/<id>, run by ANALYSIS_WORKERS threads per
+    # process; beyond ANALYSIS_MAX_PENDING_JOBS queued or running jobs, uploads are refused (503)
+    ASYNC_ANALYSIS = os.getenv("ASYNC_ANALYSIS", "true").lower() == "true"
+    ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+    ANALYSIS_MAX_PENDING_JOBS = int(os.getenv("ANALYSIS_MAX_PENDING_JOBS", "8"))
+    ANALYSIS_JOB_RETENTION_HOURS = int(os.getenv("ANALYSIS_JOB_RETENTION_HOURS", "24"))
+    # Processes touch their jobs every ANALYSIS_JOB_HEARTBEAT_SECONDS: a queued or running job not updated for
+    # ANALYSIS_JOB_STALE_SECONDS lost its process (scale-down, OOM, redeploy) and is reported as failed
+    ANALYSIS_JOB_HEARTBEAT_SECONDS = float(os.getenv("ANALYSIS_JOB_HEARTBEAT_SECONDS", "15"))
+    ANALYSIS_JOB_STALE_SECONDS = float(os.getenv("ANALYSIS_JOB_STALE_SECONDS", "120"))
+    # Analyses returned within the request (?wait=true, ?stream=true) are stored in the database by background
+    # writer threads, after the response: the report's "persistence" status_url tells when they are saved
+    BACKGROUND_PERSISTENCE = os.getenv("BACKGROUND_PERSISTENCE", "false").lower() == "true"
+    PERSISTENCE_WORKERS = int(os.getenv("PERSISTENCE_WORKERS", "2"))
+    PERSISTENCE_MAX_PENDING = int(os.getenv("PERSISTENCE_MAX_PENDING", "32"))
+    # POST /analyze/bulk: max PDFs per request (files and ZIP members), and documents analyzed at once by a bulk job
+    # (their LLM requests are queued round-robin against each other)
+    BULK_MAX_DOCUMENTS = int(os.getenv("BULK_MAX_DOCUMENTS", "500"))
+    BULK_DOCUMENTS_IN_FLIGHT = int(os.getenv("BULK_DOCUMENTS_IN_FLIGHT", "4"))
+    # Chat sessions kept in memory (see services/conversations.py)
+    CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+    CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "3600"))
+    CHAT_MAX_TURNS = int(os.getenv("CHAT_MAX_TURNS", "20"))
 
 
 CLAUSE_LABELS = ["Mutuality", "Confidentiality", "Exceptions", "Term",
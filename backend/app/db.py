@@ -2,12 +2,16 @@ import os
 from datetime import datetime
 from flask import current_app
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Text, Float, DateTime, ForeignKey, JSON, Enum, ARRAY, Index
+    create_engine, Column, Integer, String, Text, Float, DateTime, ForeignKey, JSON, Enum, ARRAY, Index, inspect,
+    text
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 import enum
 
+# Cached LLM evaluations: defined with the cache, which runs without this database with EVALUATION_CACHE=disk
+from app.services.evaluation_cache import evaluation_cache_table
+
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
@@ -31,7 +35,7 @@ class DocumentStatus(enum.Enum):
 class Document(Base):
     """Each analyzed NDA or PDF."""
     __tablename__ = "documents"
-    __table_args__ = (Index("ix_documents_status", "status"),)
+    __table_args__ = (Index("ix_documents_status", "status"), Index("ix_documents_sha256", "sha256"))
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
@@ -42,6 +46,8 @@ class Document(Base):
     pdf_url = Column(String)
     report_url = Column(String)
     status = Column(Enum(DocumentStatus), default=DocumentStatus.to_review)
+    sha256 = Column(String(64))  # of the uploaded PDF
+    analysis_version = Column(String(64))  # policy rules, models and prompt the analysis was made with
     clauses = relationship("Clause", back_populates="document", cascade="all, delete-orphan")
 
 
@@ -75,6 +81,8 @@ class Prediction(Base):
     retrieved_rules = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
     llm_evaluation = Column(JSON, nullable=True)
+    decided_by = Column(String, nullable=True)  # "llm" or "classifier"
+    confidence = Column(Float, nullable=True)  # of the classifier
     clause = relationship("Clause", back_populates="prediction")
 
 
@@ -91,9 +99,49 @@ class Rejection(Base):
     clause = relationship("Clause", back_populates="rejections")
 
 
+class AnalysisJob(Base):
+    """Background analysis of an uploaded NDA (see services/analysis_jobs.py)."""
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (Index("ix_analysis_jobs_created_at", "created_at"),)
+
+    id = Column(String(36), primary_key=True)
+    filename = Column(String)
+    status = Column(String, default="queued")  # queued, running, done, failed
+    stage = Column(String, default="queued")
+    progress = Column(JSON, default=dict)
+    report = Column(JSON, nullable=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Columns added to tables after their creation: create_all only creates missing tables
+ADDED_COLUMNS = {"documents": ["sha256", "analysis_version"], "predictions": ["decided_by", "confidence"]}
+
+
+def upgrade_schema():
+    """Add the ADDED_COLUMNS and the indexes missing from existing tables."""
+    inspector = inspect(engine)
+    for table_name, column_names in ADDED_COLUMNS.items():
+        table = Base.metadata.tables[table_name]
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        with engine.begin() as conn:
+            for name in column_names:
+                if name not in existing:
+                    print(f"Adding column {table_name}.{name}...")
+                    column_type = table.c[name].type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
 # --- Initialization helper ---
 def init_db():
     """Create tables if they don’t exist."""
     print("Initializing database schema...")
     Base.metadata.create_all(bind=engine)
+    evaluation_cache_table.create(bind=engine, checkfirst=True)
+    upgrade_schema()
     print("Database ready !")
@@ -1,10 +1,15 @@
 import os
 import json
 import time
-from flask import Blueprint, request, jsonify, current_app
+import zipfile
+from contextlib import nullcontext
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from app.services.scoring import compute_compliance_score
-from app.services.storage import upload_to_gcs
+from app.services.storage import get_storage
 from app.services.rejections_vectorstore import load_rejections_vectorstore
+from app.services.analysis_jobs import JobQueueFull, get_job, get_job_runner
+from app.services.uploads import save_upload, save_zip_pdfs
+from app.services.analysis_store import persist_report
 from app.config import Config
 
 analyze_bp = Blueprint("analyze", __name__, url_prefix="/analyze")
@@ -15,24 +20,12 @@ rejections_coll = None
 vectorstore_initialized = False
 
 
-def async_upload_and_cleanup(bucket, local_pdf, local_report, file_basename):
-    try:
-        pdf_url = upload_to_gcs(bucket, local_pdf, f"pdfs/{file_basename}")
-        report_url = upload_to_gcs(bucket, local_report, f"reports/{file_basename}_report.json")
-        print(f"✅ Uploaded {file_basename} to GCS")
-    finally:
-        for path in [local_pdf, local_report]:
-            if os.path.exists(path):
-                os.remove(path)
-                print(f"🧹 Deleted temp: {path}")
-
-
 def ensure_vectorstore_loaded():
     global policy_coll, vectorstore_initialized
     if not vectorstore_initialized:
-        from app.services.policy_matcher import create_vectorstore, load_vectorstore
+        from app.services.policy_matcher import create_vectorstore, load_vectorstore, vectorstore_exists
         print("No vectorstore initialized.")
-        if not os.path.exists(Config.VECTORSTORE_DIR) or not os.listdir(Config.VECTORSTORE_DIR):
+        if not vectorstore_exists(Config.VECTORSTORE_DIR):
             print("No policy vectorstore found. Creating policy vectorstore...")
             create_vectorstore(Config.POLICY_RULES_PATH, persist_dir=Config.VECTORSTORE_DIR)
         print("Loading policy vectorstore...")
@@ -51,14 +44,103 @@ def ensure_rejections_vectorstore_loaded():
         print("Rejections vectorstore ready!")
 
 
+def run_analysis(filepath: str, filename: str, reports_folder: str, gcs_bucket: str | None,
+                 sha256: str | None = None, progress=None, background_persistence: bool = False) -> dict:
+    """
+    Analysis of a saved upload: clause evaluation, then finalize_report.
+    Runs outside of the request context (background jobs), hence the explicit folders and bucket.
+    """
+    from app.services.policy_matcher import analyze_nda
+    progress = progress or (lambda **_: None)
+
+    t0 = time.time()
+    try:
+        results = analyze_nda(filepath, policy_coll, rejections_coll, progress)
+        return finalize_report(results, filepath, filename, reports_folder, gcs_bucket, t0, sha256, progress,
+                               background_persistence)
+    except Exception:
+        discard_upload(filepath)
+        raise
+
+
+def discard_upload(filepath: str):
+    """Deletes the upload of a failed analysis: there is no report to keep it for."""
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+
+def finalize_report(results: list, filepath: str, filename: str, reports_folder: str, gcs_bucket: str | None,
+                    t0: float, sha256: str | None = None, progress=None,
+                    background_persistence: bool = False) -> dict:
+    """
+    Scoring, JSON report, upload to storage (see get_storage) and DB storage of the evaluated clauses of a document.
+    The report's "persistence" holds the outcome of the DB storage (see persist_report), its "document_id" is
+    None until the document is stored.
+    """
+    from app.services.policy_matcher import analysis_version
+    progress = progress or (lambda **_: None)
+    progress(stage="scoring")
+    score_summary = compute_compliance_score(results)
+    print("Analysis completed.")
+
+    # Save JSON report
+    report = {
+        "filename": filename,
+        "analysis": results,
+        "total_clauses": len(results),
+        "llm_cache_hits": sum(1 for result in results if result.get("llm_cache_hit")),
+        "compliance": score_summary,
+        "time_seconds": round(time.time() - t0, 2),
+        "sha256": sha256,
+        "analysis_version": analysis_version(rejections_coll),
+    }
+
+    # Prefixed with the content hash: different documents with the same name don't overwrite each other
+    stored_name = f"{sha256[:12]}_{filename}" if sha256 else filename
+    report_path = os.path.join(reports_folder, f"{stored_name}_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=4)
+
+    # Upload to GCS (on Cloud) or STORAGE_LOCAL_DIR, both files at once; the uploaded local copies are deleted
+    pdf_url, report_url = None, None
+
+    try:
+        storage = get_storage(gcs_bucket)
+    except Exception as e:
+        print(f"⚠️ Storage unavailable: {e}")
+        storage = None
+    if storage is not None:
+        progress(stage="uploading")
+        pdf_url, report_url = storage.upload_many(
+            [(filepath, f"pdfs/{stored_name}"), (report_path, f"reports/{stored_name}_report.json")],
+            cleanup=Config.STORAGE_DELETE_UPLOADED)
+
+    report["storage"] = {
+        "pdf_url": pdf_url or filepath,
+        "report_url": report_url or report_path
+    }
+
+    progress(stage="saving")
+    report["persistence"] = persist_report(report, background_persistence)
+    report["document_id"] = report["persistence"].get("document_id")
+    return report
+
+
 @analyze_bp.route("", methods=["POST"])
 def analyze():
+    """
+    Uploads a PDF for analysis. With ?stream=true, the results are streamed as NDJSON (see stream_analysis),
+    or 503 when ANALYSIS_MAX_PENDING_JOBS analyses are already queued or running.
+    Otherwise, with ASYNC_ANALYSIS (and no ?wait=true), the analysis is queued and the response is
+    202 {"job_id", "status_url"}, to be polled at GET /analyze/jobs/<job_id>.
+    Otherwise the analysis runs within the request and the report is returned.
+    A PDF already analyzed with the current analysis_version (rejections included) gets the stored report back
+    (with "duplicate": true) in every mode, unless ?force=true.
+    """
     # Ensure vectorstore is loaded --> We import here to avoid loading embedding model during the app startup
-    from app.services.policy_matcher import analyze_nda
     ensure_vectorstore_loaded()
     ensure_rejections_vectorstore_loaded()
 
-    t0 = time.time()
     if "file" not in request.files:
         return jsonify({"error": "No file provided."}), 400
 
@@ -73,98 +155,246 @@ def analyze():
     os.makedirs(upload_folder, exist_ok=True)
     os.makedirs(reports_folder, exist_ok=True)
 
-    # Save temporarily the uploaded file
-    filepath = os.path.join(upload_folder, file.filename)
-    file.save(filepath)
+    # Save temporarily the uploaded file, under a unique name, hashing it on the way
+    filename = file.filename
+    filepath, sha256 = save_upload(file.stream, upload_folder, filename)
+    gcs_bucket = current_app.config.get("GCS_BUCKET")
+    stream = request.args.get("stream", "").lower() == "true"
+
+    if request.args.get("force", "").lower() != "true":
+        from app.services.policy_matcher import analysis_version
+        existing = find_analyzed_document(sha256, analysis_version(rejections_coll))
+        if existing is not None:
+            print(f"{filename} was already analyzed (document {existing['document_id']}), returning its report.")
+            os.remove(filepath)
+            if stream:
+                return Response(stream_stored_report(existing), mimetype="application/x-ndjson")
+            return jsonify(existing), 200
+
+    if stream:
+        # Streamed analyses run within the request, admitted like background jobs
+        runner = get_job_runner()
+        try:
+            runner.reserve()
+        except JobQueueFull as e:
+            os.remove(filepath)
+            return jsonify({"error": f"Too many analyses in progress, retry later ({e})."}), 503, \
+                {"Retry-After": "30"}
+        response = Response(
+            stream_with_context(stream_analysis(filepath, filename, reports_folder, gcs_bucket, sha256, runner)),
+            mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+        # Called however the response ends, even if the stream never started
+        response.call_on_close(runner.release)
+        return response
+
+    if Config.ASYNC_ANALYSIS and request.args.get("wait", "").lower() != "true":
+        try:
+            job_id = get_job_runner().submit(
+                filename,
+                lambda progress: run_analysis(filepath, filename, reports_folder, gcs_bucket, sha256, progress))
+        except JobQueueFull as e:
+            os.remove(filepath)
+            return jsonify({"error": f"Too many analyses in progress, retry later ({e})."}), 503, \
+                {"Retry-After": "30"}
+        except Exception:
+            os.remove(filepath)
+            raise
+        return jsonify({"job_id": job_id, "status_url": f"/analyze/jobs/{job_id}"}), 202
 
     try:
-        results = analyze_nda(filepath, policy_coll, rejections_coll)
-        score_summary = compute_compliance_score(results)
-        print("Analysis completed.")
+        report = run_analysis(filepath, filename, reports_folder, gcs_bucket, sha256,
+                              background_persistence=Config.BACKGROUND_PERSISTENCE)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    # Save JSON report
-    report = {
-        "filename": file.filename,
-        "analysis": results,
-        "total_clauses": len(results),
-        "compliance": score_summary,
-        "time_seconds": round(time.time() - t0, 2)
-    }
+    return jsonify(report), 200
 
-    report_path = os.path.join(reports_folder, f"{file.filename}_report.json")
-    with open(report_path, "w") as f:
-        json.dump(report, f, indent=4)
 
-    # Upload to GCS (on Cloud only)
-    gcs_bucket = current_app.config.get("GCS_BUCKET")
-    pdf_url, report_url = None, None
+def stream_analysis(filepath: str, filename: str, reports_folder: str, gcs_bucket: str | None,
+                    sha256: str | None = None, runner=None):
+    """
+    NDJSON records of POST /analyze?stream=true, one per line:
+        {"type": "clause", "index": <position in the document>, "clause": ..., "llm_evaluation": ...,
+            "decided_by": "llm" | "classifier", ...}
+            for each clause, as soon as it is evaluated (not in document order),
+        {"type": "summary", ...report without "analysis"}  (compliance, storage, document_id) at the end,
+        {"type": "error", "error": "..."}  if the analysis failed.
+    """
+    from app.services.policy_matcher import stream_nda_results
 
-    if gcs_bucket:
-        try:
-            pdf_url = upload_to_gcs(gcs_bucket, filepath, f"pdfs/{file.filename}")
-            report_url = upload_to_gcs(gcs_bucket, report_path, f"reports/{file.filename}_report.json")
-        except Exception as e:
-            print(f"⚠️ GCS upload failed: {e}")
+    results = {}
+    try:
+        # Waits for a worker slot, like a queued job (runner.reserve() was called by the route)
+        with runner.slot() if runner else nullcontext():
+            t0 = time.time()
+            for index, result in stream_nda_results(filepath, policy_coll, rejections_coll):
+                results[index] = result
+                yield json.dumps({"type": "clause", "index": index, **result}) + "\n"
+            report = finalize_report([results[index] for index in sorted(results)], filepath, filename,
+                                     reports_folder, gcs_bucket, t0, sha256,
+                                     background_persistence=Config.BACKGROUND_PERSISTENCE)
+        summary = {key: value for key, value in report.items() if key != "analysis"}
+        yield json.dumps({"type": "summary", **summary}) + "\n"
+    except GeneratorExit:
+        print(f"Client disconnected, analysis of {filename} cancelled.")
+        discard_upload(filepath)
+        raise
+    except Exception as e:
+        print(f"❌ Error in streamed analysis of {filename}: {e}")
+        discard_upload(filepath)
+        yield json.dumps({"type": "error", "error": str(e)}) + "\n"
 
-    report["storage"] = {
-        "pdf_url": pdf_url or filepath,
-        "report_url": report_url or report_path
-    }
 
-    # TODO: try to store on PGSQL while analyzing
-    store_doc_analysis_in_db(report)
+@analyze_bp.route("/bulk", methods=["POST"])
+def analyze_bulk():
+    """
+    Analysis of many PDFs as one background job: any number of "files" parts, PDFs or ZIP archives of PDFs
+    (BULK_MAX_DOCUMENTS in total). Documents already analyzed (see analyze) are not analyzed again unless
+    ?force=true, nor are identical PDFs of the same request. Returns 202 {"job_id", "status_url", ...}.
+    The job's progress holds documents_done / documents_total, clauses_evaluated, documents_per_minute and
+    clauses_per_second; its report lists every document with its document_id, compliance or error.
+    """
+    ensure_vectorstore_loaded()
+    ensure_rejections_vectorstore_loaded()
+    from app.services.policy_matcher import analysis_version
+    from app.services.bulk_analysis import BulkDocument, analyze_documents
 
-    # TODO: delete the local files after upload if needed
+    uploads = request.files.getlist("files") + request.files.getlist("file")
+    if not uploads:
+        return jsonify({"error": "No file provided."}), 400
 
-    return jsonify(report), 200
+    upload_folder = current_app.config["UPLOAD_FOLDER"]
+    reports_folder = current_app.config["REPORT_FOLDER"]
+    os.makedirs(upload_folder, exist_ok=True)
+    os.makedirs(reports_folder, exist_ok=True)
+    gcs_bucket = current_app.config.get("GCS_BUCKET")
 
+    saved, skipped = [], []
+    try:
+        for upload in uploads:
+            remaining = Config.BULK_MAX_DOCUMENTS - len(saved)
+            if upload.filename.lower().endswith(".zip"):
+                saved.extend(save_zip_pdfs(upload.stream, upload_folder, remaining))
+            elif upload.filename.lower().endswith(".pdf"):
+                if remaining == 0:
+                    raise ValueError(f"More than {Config.BULK_MAX_DOCUMENTS} PDFs")
+                path, sha256 = save_upload(upload.stream, upload_folder, upload.filename)
+                saved.append((path, upload.filename, sha256))
+            else:
+                skipped.append(upload.filename)
+    except (ValueError, zipfile.BadZipFile) as e:
+        for path, _, _ in saved:
+            os.remove(path)
+        return jsonify({"error": str(e)}), 400
+    if not saved:
+        return jsonify({"error": "No PDF found in the upload.", "skipped": skipped}), 400
 
-def store_doc_analysis_in_db(report: dict):
-    from app.db import SessionLocal, Document, Clause, Prediction
+    force = request.args.get("force", "").lower() == "true"
+    version = analysis_version(rejections_coll)
+    documents, known = [], []
+    first_with_hash = {}
+    for path, filename, sha256 in saved:
+        existing = None if force else find_analyzed_document(sha256, version)
+        if existing is not None or sha256 in first_with_hash:
+            os.remove(path)
+            known.append({"filename": filename, "sha256": sha256, "duplicate": True,
+                          "document_id": existing["document_id"] if existing else None,
+                          "same_as": None if existing else first_with_hash[sha256],
+                          "compliance": existing["compliance"] if existing else None})
+            continue
+        first_with_hash[sha256] = filename
+        documents.append(BulkDocument(path, filename, sha256))
 
-    db = SessionLocal()
+    def finish(document: BulkDocument, results: list, t0: float) -> dict:
+        return finalize_report(results, document.path, document.filename, reports_folder, gcs_bucket, t0,
+                               document.sha256)
+
+    def work(progress) -> dict:
+        report = analyze_documents(documents, policy_coll, rejections_coll, finish, progress) if documents \
+            else {"documents": []}
+        report["duplicates"] = known
+        report["skipped"] = skipped
+        return report
 
     try:
-        doc = Document(
-            filename=report["filename"],
-            total_clauses=report["total_clauses"],
-            compliance_score=report["compliance"]["compliance_score"],
-            compliance_details=report["compliance"]["details"],
-            pdf_url=report["storage"]["pdf_url"],
-            report_url=report["storage"]["report_url"],
-            status=report["compliance"]["status"],
-        )
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-
-        for clause_data in report["analysis"]:
-            clause = Clause(
-                document_id=doc.id,
-                title=clause_data["clause"]["title"],
-                body=clause_data["clause"]["body"],
-                pages=clause_data["clause"]["pages"]
-            )
-            db.add(clause)
-            db.commit()
-            db.refresh(clause)
-
-            prediction = Prediction(
-                clause_id=clause.id,
-                best_rule=clause_data["llm_evaluation"].get("best_rule"),
-                severity=clause_data["llm_evaluation"].get("severity", "low"),
-                status=clause_data["llm_evaluation"].get("status", "red_flag"),
-                reason=clause_data["llm_evaluation"].get("reason", ""),
-                retrieved_rules=clause_data.get("retrieved_rules", []),
-                llm_evaluation=clause_data.get("llm_evaluation", {}),
-            )
-            db.add(prediction)
-            db.commit()
+        job_id = get_job_runner().submit(f"{len(saved)} documents", work)
+    except JobQueueFull as e:
+        for document in documents:
+            os.remove(document.path)
+        return jsonify({"error": f"Too many analyses in progress, retry later ({e})."}), 503, {"Retry-After": "30"}
+    return jsonify({"job_id": job_id, "status_url": f"/analyze/jobs/{job_id}", "documents": len(documents),
+                    "duplicates": len(known), "skipped": skipped}), 202
+
+
+def stream_stored_report(report: dict):
+    """The records of stream_analysis for a report that is already stored."""
+    for index, result in enumerate(report["analysis"]):
+        yield json.dumps({"type": "clause", "index": index, **result}) + "\n"
+    summary = {key: value for key, value in report.items() if key != "analysis"}
+    yield json.dumps({"type": "summary", **summary}) + "\n"
+
+
+def find_analyzed_document(sha256: str, version: str) -> dict | None:
+    """
+    Report of the latest document with this content analyzed with this analysis version, rebuilt from
+    the database (three indexed queries), or None. Reports with failed clause evaluations are not reused.
+    """
+    from sqlalchemy.orm import selectinload
+    from app.db import SessionLocal, Document, Clause
 
+    db = SessionLocal()
+    try:
+        doc = (db.query(Document)
+               .filter(Document.sha256 == sha256, Document.analysis_version == version)
+               .options(selectinload(Document.clauses).selectinload(Clause.prediction))
+               .order_by(Document.uploaded_at.desc())
+               .first())
+        if doc is None:
+            return None
+        # A report with failed evaluations is analyzed again rather than served
+        if any(clause.prediction is None or (clause.prediction.llm_evaluation or {}).get("degraded")
+               or clause.prediction.best_rule == "Parsing Error" for clause in doc.clauses):
+            print(f"Document {doc.id} has failed clause evaluations, not reused.")
+            return None
+        results = [{
+            "clause": {"title": clause.title, "body": clause.body, "pages": clause.pages},
+            "retrieved_rules": (clause.prediction.retrieved_rules or []) if clause.prediction else [],
+            "llm_evaluation": (clause.prediction.llm_evaluation or {}) if clause.prediction else {},
+            "llm_cache_hit": False,
+            "decided_by": (clause.prediction.decided_by or "llm") if clause.prediction else "llm",
+            "confidence": clause.prediction.confidence if clause.prediction else None,
+        } for clause in sorted(doc.clauses, key=lambda c: c.id)]
+        return {
+            "filename": doc.filename,
+            "analysis": results,
+            "total_clauses": doc.total_clauses,
+            "compliance": {
+                "compliance_score": doc.compliance_score,
+                "details": doc.compliance_details,
+                "status": doc.status.value if doc.status else None,
+            },
+            "storage": {"pdf_url": doc.pdf_url, "report_url": doc.report_url},
+            "sha256": doc.sha256,
+            "analysis_version": doc.analysis_version,
+            "document_id": doc.id,
+            "duplicate": True,
+        }
     except Exception as e:
-        db.rollback()
-        print(f"Error storing analysis in DB: {e}")
+        # Not being able to check is not a reason to refuse the analysis
+        print(f"⚠️ Duplicate lookup failed: {e}")
+        return None
     finally:
         db.close()
+
+
+@analyze_bp.route("/jobs/<job_id>", methods=["GET"])
+def analysis_job_status(job_id):
+    """
+    Status of an analysis job: status (queued, running, done, failed), stage (queued, starting, extracting,
+    evaluating, scoring, uploading, saving, done), progress counts, and the report once done.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
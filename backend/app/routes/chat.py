@@ -1,16 +1,114 @@
-from flask import Blueprint, request, jsonify
-from app.services.llm import call_llm
+import json
+import uuid
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.services.llm import call_llm, stream_llm, chat_messages
+from app.services.conversations import CHAT_SYSTEM_PROMPT, get_conversation_store
 from app.services.rejections_vectorstore import load_rejections_vectorstore
 from app.config import Config
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/chat")
 
 
+def build_chat_prompt(data: dict) -> tuple:
+    """Returns (prompt, None), or (None, error message) when the request is incomplete."""
+    question = data.get("question", "").strip()
+    clause_text = data.get("clause", "").strip()
+    reason = data.get("reason", "").strip() if data.get("reason") else ""
+    status = data.get("status", "").strip() if data.get("status") else ""
+
+    if not question:
+        return None, "Missing 'question'"
+    if not clause_text:
+        return None, "Missing 'clause'"
+
+    # --- Construct contextual prompt ---
+    context_parts = [
+        f"Clause text:\n{clause_text}",
+        f"User question:\n{question}",
+    ]
+    if reason:
+        context_parts.append(f"LLM original reasoning:\n{reason}")
+    if status:
+        context_parts.append(f"Clause flagged status:\n{status}")
+
+    return "\n\n".join(context_parts), None
+
+
+def format_clause_context(clause, prediction, rejections) -> str:
+    """Clause, its evaluation, the policy rules it was evaluated against and the reviewers' feedback."""
+    parts = [CHAT_SYSTEM_PROMPT,
+             f"Clause '{clause.title or clause.id}' (pages {', '.join(map(str, clause.pages or []))}):\n{clause.body}"]
+    if prediction is not None:
+        parts.append(f"Clause flagged status:\n{prediction.status}\n\n"
+                     f"Best matching rule:\n{prediction.best_rule} (severity: {prediction.severity})\n\n"
+                     f"LLM original reasoning:\n{prediction.reason}")
+        rules = [f"- {rule.get('title')} (severity: {rule.get('severity')}): {rule.get('content', '')}"
+                 for rule in prediction.retrieved_rules or []]
+        if rules:
+            parts.append("Policy rules retrieved for this clause:\n" + "\n".join(rules))
+    feedback = [f"- {rejection.new_status}: {rejection.comment or '(no comment)'}"
+                for rejection in sorted(rejections, key=lambda r: r.id)]
+    if feedback:
+        parts.append("Reviewers rejected this evaluation:\n" + "\n".join(feedback))
+    return "\n\n".join(parts)
+
+
+def load_clause_context(clause_id: int) -> str | None:
+    """Chat context of a stored clause, None if it doesn't exist. Loaded once per chat session."""
+    from app.db import SessionLocal, Clause
+
+    db = SessionLocal()
+    try:
+        clause = db.get(Clause, clause_id)
+        if clause is None:
+            return None
+        return format_clause_context(clause, clause.prediction, clause.rejections)
+    finally:
+        db.close()
+
+
+def prepare_chat(data: dict) -> tuple:
+    """
+    Returns (messages, conversation, session_id, None), or (None, None, None, (error message, status code)).
+    With a clause_id, the clause context comes from the database and the conversation is kept server side
+    under session_id (a new one is made when missing). Otherwise the prompt is built from the request alone.
+    """
+    if data.get("clause_id") is None:
+        full_prompt, error = build_chat_prompt(data)
+        if error:
+            return None, None, None, (error, 400)
+        return chat_messages(full_prompt), None, None, None
+
+    question = data.get("question", "").strip()
+    if not question:
+        return None, None, None, ("Missing 'question'", 400)
+    try:
+        clause_id = int(data["clause_id"])
+    except (TypeError, ValueError):
+        return None, None, None, ("Invalid 'clause_id'", 400)
+    session_id = str(data.get("session_id") or uuid.uuid4())
+    conversation = get_conversation_store().get_or_create(session_id, clause_id, load_clause_context)
+    if conversation is None:
+        return None, None, None, (f"Clause {clause_id} not found", 404)
+    return conversation.chat_messages(question), conversation, session_id, None
+
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
 @chat_bp.route("", methods=["POST"])
 def chat_with_clause():
     """
     Interactive explanation/chat endpoint.
     Input:
+        {
+            "question": "Why is this clause risky?",
+            "clause_id": 42,
+            "session_id": "..."  (optional, returned by the first answer)
+        }
+    or, for a clause that is not stored:
         {
             "question": "Why is this clause risky?",
             "clause": "Full text of the clause",
@@ -21,38 +119,65 @@ def chat_with_clause():
     try:
         data = request.get_json(force=True)
         question = data.get("question", "").strip()
-        clause_text = data.get("clause", "").strip()
-        reason = data.get("reason", "").strip() if data.get("reason") else ""
-        status = data.get("status", "").strip() if data.get("status") else ""
-
-        if not question:
-            return jsonify({"error": "Missing 'question'"}), 400
-        if not clause_text:
-            return jsonify({"error": "Missing 'clause'"}), 400
-
-        # --- Construct contextual prompt ---
-        context_parts = [
-            f"Clause text:\n{clause_text}",
-            f"User question:\n{question}",
-        ]
-        if reason:
-            context_parts.append(f"LLM original reasoning:\n{reason}")
-        if status:
-            context_parts.append(f"Clause flagged status:\n{status}")
-
-        full_prompt = "\n\n".join(context_parts)
+        messages, conversation, session_id, error = prepare_chat(data)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
 
         # --- Call LLM ---
         answer = call_llm(
-            prompt=full_prompt,
+            messages=messages,
             model="gpt-4o-mini",
             temperature=0.4,
         )
+        if conversation is not None:
+            get_conversation_store().add_turn(conversation, question, answer)
 
         return jsonify({
             "answer": answer,
+            "session_id": session_id,
         })
 
     except Exception as e:
         print(f"❌ Error in /chat: {e}")
         return jsonify({"error": str(e)}), 500
+
+
+@chat_bp.route("/stream", methods=["POST"])
+def chat_with_clause_stream():
+    """
+    Same input as /chat, the answer is streamed as server-sent events while it is generated:
+        data: {"token": "..."}      (as many as needed)
+        event: done / data: {"session_id": "..."}      (end of the answer)
+        event: error / data: {"error": "..."}
+    When the client disconnects, writing the next event fails and the generator is closed,
+    which closes the OpenAI stream and stops the generation. An interrupted answer is not kept in the session.
+    """
+    data = request.get_json(force=True)
+    question = data.get("question", "").strip()
+    messages, conversation, session_id, error = prepare_chat(data)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    def generate():
+        tokens = None
+        try:
+            tokens = stream_llm(messages=messages, model="gpt-4o-mini", temperature=0.4)
+            answer = []
+            for token in tokens:
+                answer.append(token)
+                yield sse_event({"token": token})
+            if conversation is not None:
+                get_conversation_store().add_turn(conversation, question, "".join(answer))
+            yield sse_event({"session_id": session_id}, event="done")
+        except GeneratorExit:
+            print("Chat client disconnected, generation cancelled.")
+            raise
+        except Exception as e:
+            print(f"❌ Error in /chat/stream: {e}")
+            yield sse_event({"error": str(e)}, event="error")
+        finally:
+            if tokens is not None:
+                tokens.close()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -59,6 +59,8 @@ def get_document(doc_id: int):
                     "reason": prediction.reason if prediction else None,
                     "retrieved_rules": prediction.retrieved_rules if prediction else [],
                     "llm_evaluation": prediction.llm_evaluation if prediction else None,
+                    "decided_by": prediction.decided_by if prediction else None,
+                    "confidence": prediction.confidence if prediction else None,
                 } if prediction else None,
                 "rejections": rejections,
             })
@@ -1,10 +1,26 @@
 from flask import Blueprint, jsonify
 from app.routes.analyze import ensure_vectorstore_loaded
+from app.services.extraction_cache import get_extraction_cache
+from app.services.embeddings import get_embedding_cache
+from app.services.evaluation_cache import get_evaluation_cache
+from app.services.llm_providers import get_llm_provider
 
 health_bp = Blueprint("health", __name__, url_prefix="/health")
 
 
 @health_bp.route("", methods=["GET"])
 def health():
+    from app.services.policy_matcher import parse_stats
     ensure_vectorstore_loaded()
-    return jsonify({"status": "ok", "vectorstore_loaded": True}), 200
+    extraction_cache = get_extraction_cache()
+    embedding_cache = get_embedding_cache()
+    evaluation_cache = get_evaluation_cache()
+    return jsonify({
+        "status": "ok",
+        "vectorstore_loaded": True,
+        "extraction_cache": extraction_cache.stats() if extraction_cache else None,
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "evaluation_cache": evaluation_cache.stats() if evaluation_cache else None,
+        "llm_provider": get_llm_provider().name,
+        "llm_parsing": parse_stats(),
+    }), 200
@@ -0,0 +1,218 @@
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from app.config import Config
+
+# Progress of a running job is written at most this often, stage changes are always written
+PROGRESS_WRITE_INTERVAL_SECONDS = 1.0
+
+
+class JobQueueFull(Exception):
+    """Too many analysis jobs queued or running in this process."""
+
+
+def job_to_dict(job) -> dict:
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress or {},
+        "document_id": job.document_id,
+        "error": job.error,
+        "report": job.report,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def update_job(job_id: str, **fields):
+    from app.db import SessionLocal, AnalysisJob
+
+    db = SessionLocal()
+    try:
+        job = db.get(AnalysisJob, job_id)
+        if job is None:
+            return
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.updated_at = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Could not update analysis job {job_id}: {e}")
+    finally:
+        db.close()
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """The job, marked failed if it is queued or running but its process stopped touching it (see heartbeat)."""
+    from app.db import SessionLocal, AnalysisJob
+
+    db = SessionLocal()
+    try:
+        job = db.get(AnalysisJob, job_id)
+        if job is None:
+            return None
+        stale_since = datetime.utcnow() - timedelta(seconds=Config.ANALYSIS_JOB_STALE_SECONDS)
+        if job.status in ("queued", "running") and job.updated_at and job.updated_at < stale_since:
+            print(f"⚠️ Analysis job {job_id} lost its worker, marked failed.")
+            job.status = "failed"
+            job.error = f"The worker running the analysis stopped (no update since {job.updated_at.isoformat()})."
+            job.updated_at = datetime.utcnow()
+            db.commit()
+        return job_to_dict(job)
+    finally:
+        db.close()
+
+
+class JobProgress:
+    """
+    Progress callback handed to the analysis: progress(stage=..., clauses_found=..., ...) merges the given
+    values into the job's progress. Writes are throttled, as it is called for every evaluated batch of clauses.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.stage = None
+        self.values = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str | None = None, **values):
+        with self._lock:
+            self.values.update(values)
+            stage_changed = stage is not None and stage != self.stage
+            if stage_changed:
+                self.stage = stage
+            if not stage_changed and time.monotonic() - self._last_write < PROGRESS_WRITE_INTERVAL_SECONDS:
+                return
+            self._last_write = time.monotonic()
+            fields = {"progress": dict(self.values), "stage": self.stage}
+        update_job(self.job_id, **fields)
+
+
+class AnalysisJobRunner:
+    """
+    Runs analyses in a bounded pool of threads. Jobs are stored in the database, so that any worker process
+    can report their status, but they run in the process that accepted the upload: a job whose process dies
+    is reported as failed once ANALYSIS_JOB_STALE_SECONDS passed without its heartbeat.
+    Analyses streamed within their request are admitted the same way (see reserve and slot): they count
+    against max_pending and take one of the max_workers slots while they run.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._jobs = set()
+        self._heartbeat = None
+
+    def reserve(self):
+        """Counts an analysis run outside of the pool, raises JobQueueFull like submit. Undone by release."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} analyses already queued or running")
+            self._pending += 1
+
+    def release(self):
+        with self._lock:
+            self._pending -= 1
+
+    @contextmanager
+    def slot(self):
+        """Waits for one of the max_workers analyses running at once to end."""
+        with self._slots:
+            yield
+
+    def submit(self, filename: str, work: Callable[[JobProgress], dict]) -> str:
+        """
+        Queues work(progress), which returns the report of the analysis, and returns the job id.
+        Raises JobQueueFull when max_pending jobs are already queued or running.
+        """
+        from app.db import SessionLocal, AnalysisJob
+
+        self.reserve()
+        job_id = str(uuid.uuid4())
+        db = SessionLocal()
+        try:
+            db.query(AnalysisJob).filter(
+                AnalysisJob.created_at < datetime.utcnow() - timedelta(hours=Config.ANALYSIS_JOB_RETENTION_HOURS),
+                AnalysisJob.status.in_(["done", "failed"]),
+            ).delete(synchronize_session=False)
+            db.add(AnalysisJob(id=job_id, filename=filename, status="queued", stage="queued", progress={}))
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.release()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self._jobs.add(job_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="analysis-job-heartbeat", daemon=True)
+                self._heartbeat.start()
+        self._executor.submit(self._run, job_id, work)
+        return job_id
+
+    def _beat(self):
+        from app.db import SessionLocal, AnalysisJob
+
+        while True:
+            time.sleep(Config.ANALYSIS_JOB_HEARTBEAT_SECONDS)
+            with self._lock:
+                job_ids = list(self._jobs)
+            if not job_ids:
+                continue
+            db = SessionLocal()
+            try:
+                db.query(AnalysisJob).filter(
+                    AnalysisJob.id.in_(job_ids), AnalysisJob.status.in_(["queued", "running"])
+                ).update({AnalysisJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Could not record the heartbeat of {len(job_ids)} analysis jobs: {e}")
+            finally:
+                db.close()
+
+    def _run(self, job_id: str, work: Callable[[JobProgress], dict]):
+        t0 = time.time()
+        try:
+            with self.slot():
+                update_job(job_id, status="running", stage="starting")
+                report = work(JobProgress(job_id))
+            update_job(job_id, status="done", stage="done", report=report, document_id=report.get("document_id"))
+            print(f"✅ Analysis job {job_id} done in {time.time() - t0:.1f}s")
+        except Exception as e:
+            print(f"❌ Analysis job {job_id} failed: {e}")
+            update_job(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._jobs.discard(job_id)
+            self.release()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+
+_job_runner = None
+_job_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> AnalysisJobRunner:
+    global _job_runner
+    with _job_runner_lock:
+        if _job_runner is None:
+            _job_runner = AnalysisJobRunner(Config.ANALYSIS_WORKERS, Config.ANALYSIS_MAX_PENDING_JOBS)
+    return _job_runner
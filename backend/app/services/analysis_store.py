@@ -0,0 +1,86 @@
+import threading
+
+from app.config import Config
+from app.services.analysis_jobs import AnalysisJobRunner, JobQueueFull
+
+
+def store_analysis(report: dict) -> int:
+    """
+    Stores the document, clauses and predictions of an analysis report in one transaction, with one bulk INSERT
+    per table (clause ids come back with RETURNING, in the order of the report). Returns the document id.
+    Raises if anything fails: nothing is stored then.
+    """
+    from sqlalchemy import insert
+    from app.db import SessionLocal, Document, Clause, Prediction
+
+    with SessionLocal() as db, db.begin():
+        document_id = db.execute(insert(Document).returning(Document.id), [{
+            "filename": report["filename"],
+            "total_clauses": report["total_clauses"],
+            "compliance_score": report["compliance"]["compliance_score"],
+            "compliance_details": report["compliance"]["details"],
+            "pdf_url": report["storage"]["pdf_url"],
+            "report_url": report["storage"]["report_url"],
+            "status": report["compliance"]["status"],
+            "sha256": report.get("sha256"),
+            "analysis_version": report.get("analysis_version"),
+        }]).scalar_one()
+        if not report["analysis"]:
+            return document_id
+
+        clause_ids = db.scalars(insert(Clause).returning(Clause.id, sort_by_parameter_order=True), [{
+            "document_id": document_id,
+            "title": clause_data["clause"]["title"],
+            "body": clause_data["clause"]["body"],
+            "pages": clause_data["clause"]["pages"],
+        } for clause_data in report["analysis"]]).all()
+
+        db.execute(insert(Prediction), [{
+            "clause_id": clause_id,
+            "best_rule": clause_data["llm_evaluation"].get("best_rule"),
+            "severity": clause_data["llm_evaluation"].get("severity", "low"),
+            "status": clause_data["llm_evaluation"].get("status", "red_flag"),
+            "reason": clause_data["llm_evaluation"].get("reason", ""),
+            "retrieved_rules": clause_data.get("retrieved_rules", []),
+            "llm_evaluation": clause_data.get("llm_evaluation", {}),
+            "decided_by": clause_data.get("decided_by"),
+            "confidence": clause_data.get("confidence"),
+        } for clause_id, clause_data in zip(clause_ids, report["analysis"])])
+    return document_id
+
+
+def persist_report(report: dict, background: bool = False) -> dict:
+    """
+    Stores the report (see store_analysis) and returns its persistence status:
+        {"status": "saved", "document_id": ...} or {"status": "failed", "error": ...},
+        {"status": "pending", "job_id": ..., "status_url": ...} when written in the background: the job gets the
+            document_id once saved, or status "failed" and the error.
+    A full background writer queue falls back to writing right away.
+    """
+    if background:
+        try:
+            job_id = get_analysis_writer().submit(report["filename"],
+                                                  lambda progress: {"document_id": store_analysis(report)})
+            return {"status": "pending", "job_id": job_id, "status_url": f"/analyze/jobs/{job_id}"}
+        except JobQueueFull:
+            print("⚠️ Background writer queue full, storing the analysis right away.")
+        except Exception as e:
+            print(f"⚠️ Could not queue the analysis for storage, storing it right away: {e}")
+    try:
+        return {"status": "saved", "document_id": store_analysis(report)}
+    except Exception as e:
+        print(f"❌ Error storing analysis in DB: {e}")
+        return {"status": "failed", "error": str(e)}
+
+
+_analysis_writer = None
+_analysis_writer_lock = threading.Lock()
+
+
+def get_analysis_writer() -> AnalysisJobRunner:
+    """Background writes are jobs too, on their own threads so that they don't wait behind analyses."""
+    global _analysis_writer
+    with _analysis_writer_lock:
+        if _analysis_writer is None:
+            _analysis_writer = AnalysisJobRunner(Config.PERSISTENCE_WORKERS, Config.PERSISTENCE_MAX_PENDING)
+    return _analysis_writer
@@ -0,0 +1,116 @@
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List
+
+import chromadb
+
+from app.config import Config
+from app.services.llm import llm_queue_key
+from app.services.policy_matcher import analyze_nda_streaming_async
+
+
+@dataclass
+class BulkDocument:
+    path: str
+    filename: str
+    sha256: str
+
+
+class BulkProgress:
+    """Aggregated progress of a bulk analysis, reported through the progress callback of its job."""
+
+    def __init__(self, documents_total: int, progress: Callable[..., None]):
+        self.progress = progress
+        self.start = time.monotonic()
+        self.documents_total = documents_total
+        self.documents_done = 0
+        self.documents_failed = 0
+        self.clauses_found = {}
+        self.clauses_evaluated = {}
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        clauses_evaluated = sum(self.clauses_evaluated.values())
+        return {
+            "documents_total": self.documents_total,
+            "documents_done": self.documents_done,
+            "documents_failed": self.documents_failed,
+            "clauses_found": sum(self.clauses_found.values()),
+            "clauses_evaluated": clauses_evaluated,
+            "elapsed_seconds": round(elapsed, 1),
+            "documents_per_minute": round((self.documents_done + self.documents_failed) * 60 / elapsed, 2),
+            "clauses_per_second": round(clauses_evaluated / elapsed, 2),
+        }
+
+    def document_progress(self, index: int) -> Callable[..., None]:
+        """Progress callback of one document (see analyze_nda), its counts are summed with the others'."""
+        def progress(stage: str | None = None, clauses_found: int | None = None,
+                     clauses_evaluated: int | None = None, **_):
+            if clauses_found is not None:
+                self.clauses_found[index] = clauses_found
+            if clauses_evaluated is not None:
+                self.clauses_evaluated[index] = clauses_evaluated
+            self.progress(**self.stats())
+        return progress
+
+    def document_finished(self, failed: bool):
+        if failed:
+            self.documents_failed += 1
+        else:
+            self.documents_done += 1
+        self.progress(**self.stats())
+
+
+async def analyze_documents_async(documents: List[BulkDocument], policy_coll: chromadb.api.models.Collection,
+                                  rejections_coll: chromadb.api.models.Collection,
+                                  finish: Callable[[BulkDocument, list, float], dict],
+                                  progress: Callable[..., None]) -> dict:
+    """
+    Analyzes the documents BULK_DOCUMENTS_IN_FLIGHT at a time in one event loop. Each document has its own LLM
+    queue: the process-wide LLM limit serves it in turn with the other documents and analyses (see llm.py).
+    Extraction runs in threads of the loop, OCR in the process-wide OCR pool shared by all documents.
+    finish(document, results, t0) stores a document's results (in a thread) and returns its report.
+    """
+    bulk_progress = BulkProgress(len(documents), progress)
+    bulk_progress.progress(stage="evaluating", **bulk_progress.stats())
+    in_flight = asyncio.Semaphore(Config.BULK_DOCUMENTS_IN_FLIGHT)
+
+    async def analyze_document(index: int, document: BulkDocument) -> dict:
+        async with in_flight:
+            # Unique across the process: the queues of other analyses and bulk jobs are served in turn with these
+            llm_queue_key.set((bulk_progress, index))
+            t0 = time.time()
+            try:
+                results = await analyze_nda_streaming_async(document.path, policy_coll, rejections_coll,
+                                                            bulk_progress.document_progress(index))
+                report = await asyncio.to_thread(finish, document, results, t0)
+            except Exception as e:
+                print(f"❌ Bulk analysis of {document.filename} failed: {e}")
+                bulk_progress.document_finished(failed=True)
+                return {"filename": document.filename, "sha256": document.sha256, "error": str(e)}
+            bulk_progress.document_finished(failed=False)
+            return {
+                "filename": document.filename,
+                "sha256": document.sha256,
+                "document_id": report.get("document_id"),
+                "total_clauses": report["total_clauses"],
+                "compliance": report["compliance"],
+                "storage": report["storage"],
+                "persistence": report["persistence"]["status"],
+            }
+
+    # Each task runs in a copy of the context: llm_queue_key is set per document
+    reports = await asyncio.gather(*[analyze_document(i, document) for i, document in enumerate(documents)])
+    bulk_progress.progress(stage="done", **bulk_progress.stats())
+    return {"documents": reports, **bulk_progress.stats()}
+
+
+def analyze_documents(documents: List[BulkDocument], policy_coll: chromadb.api.models.Collection,
+                      rejections_coll: chromadb.api.models.Collection,
+                      finish: Callable[[BulkDocument, list, float], dict],
+                      progress: Callable[..., None] | None = None) -> dict:
+    """Sync wrapper for the analysis jobs."""
+    print(f"Bulk analysis of {len(documents)} documents...")
+    return asyncio.run(analyze_documents_async(documents, policy_coll, rejections_coll, finish,
+                                               progress or (lambda **_: None)))
@@ -0,0 +1,95 @@
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from app.config import Config
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a legal assistant specialized in NDA analysis. "
+    "Answer the user's questions about the NDA clause below, its evaluation against the internal compliance "
+    "policy and the feedback of legal reviewers. Be concise and cite the clause when relevant."
+)
+
+
+@dataclass
+class Conversation:
+    clause_id: int
+    # System prompt + clause context, built once: it is sent unchanged at every turn
+    prefix: str
+    messages: List[dict] = field(default_factory=list)
+    last_used: float = field(default_factory=time.monotonic)
+
+    def chat_messages(self, question: str) -> List[dict]:
+        """Stable prefix first, then the previous turns, then the new question: only the end changes."""
+        return [{"role": "system", "content": self.prefix}, *self.messages, {"role": "user", "content": question}]
+
+
+class ConversationStore:
+    """
+    In-process chat sessions: at most max_sessions (least recently used are dropped), each forgotten after
+    ttl_seconds without activity and keeping its last max_turns question/answer pairs.
+    Sessions live in the memory of a worker: a session landing on another worker starts over
+    (the clause context is reloaded from the database).
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float, max_turns: int):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: str, clause_id: int,
+                      build_prefix: Callable[[int], Optional[str]]) -> Optional[Conversation]:
+        """
+        The session's conversation, started with build_prefix(clause_id) if there is none or it was about
+        another clause. None if build_prefix returns None (unknown clause).
+        """
+        with self._lock:
+            self._evict_expired()
+            conversation = self._sessions.get(session_id)
+            if conversation is not None and conversation.clause_id == clause_id:
+                conversation.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                return conversation
+
+        # Built outside the lock: it queries the database
+        prefix = build_prefix(clause_id)
+        if prefix is None:
+            return None
+        conversation = Conversation(clause_id=clause_id, prefix=prefix)
+        with self._lock:
+            self._sessions[session_id] = conversation
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return conversation
+
+    def add_turn(self, conversation: Conversation, question: str, answer: str):
+        with self._lock:
+            conversation.messages.extend([{"role": "user", "content": question},
+                                          {"role": "assistant", "content": answer}])
+            del conversation.messages[:-2 * self.max_turns]
+            conversation.last_used = time.monotonic()
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [session_id for session_id, conversation in self._sessions.items()
+                   if now - conversation.last_used > self.ttl_seconds]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+
+_conversation_store = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    global _conversation_store
+    with _conversation_store_lock:
+        if _conversation_store is None:
+            _conversation_store = ConversationStore(Config.CHAT_MAX_SESSIONS, Config.CHAT_SESSION_TTL_SECONDS,
+                                                    Config.CHAT_MAX_TURNS)
+    return _conversation_store
@@ -0,0 +1,110 @@
+import os
+import shutil
+from typing import List
+
+import numpy as np
+
+from app.config import Config
+
+EMBEDDING_BACKENDS = ["torch", "onnx"]
+
+# Model of the ONNX export (see export_quantized_onnx), the only one the "onnx" backend can embed with
+ONNX_MODEL_NAME = "all-MiniLM-L6-v2"
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+ONNX_TOKENIZER_FILES = ["tokenizer.json", "tokenizer_config.json", "special_tokens_map.json", "vocab.txt",
+                        "config.json"]
+# Same truncation as sentence-transformers' all-MiniLM-L6-v2 (max_seq_length)
+ONNX_MAX_SEQ_LENGTH = 256
+
+
+class OnnxEncoder:
+    """
+    Runs a (int8-quantized) ONNX export of a sentence-transformers model through onnxruntime:
+    tokenization, transformer, mean pooling over the attention mask and L2 normalization,
+    i.e. what SentenceTransformer does for all-MiniLM-L6-v2, without torch.
+    Texts are embedded by batches padded to their longest text rather than to ONNX_MAX_SEQ_LENGTH.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = 32, num_threads: int = 0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, ONNX_QUANTIZED_MODEL_FILE)
+        if not os.path.exists(model_path):
+            print(f"⚠️ No quantized model in {model_dir}, using the full precision one.")
+            model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=ONNX_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def __call__(self, texts: List[str]) -> List[np.ndarray]:
+        embeddings = []
+        for i in range(0, len(texts), self.batch_size):
+            embeddings.extend(self._encode_batch(texts[i:i + self.batch_size]))
+        return embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask,
+                  "token_type_ids": np.zeros_like(input_ids)}
+        token_embeddings = self.session.run(None, {k: v for k, v in inputs.items() if k in self.input_names})[0]
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+
+def create_encoder(model_name: str, backend: str = Config.EMBEDDING_BACKEND):
+    """Return a callable embedding a list of texts with the given backend."""
+    if backend == "onnx":
+        # Embeddings are cached and indexed under model_name: they must come from that model
+        if model_name.split("/")[-1] != ONNX_MODEL_NAME:
+            raise ValueError(f"The onnx embedding backend only runs {ONNX_MODEL_NAME}, not {model_name}: "
+                             f"use EMBEDDING_BACKEND=torch for other models")
+        return OnnxEncoder(Config.ONNX_MODEL_DIR, num_threads=Config.ONNX_THREADS)
+    if backend == "torch":
+        from chromadb.utils import embedding_functions
+        return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+    raise ValueError(f"Unknown embedding backend {backend}, expected one of {EMBEDDING_BACKENDS}")
+
+
+def export_quantized_onnx(output_dir: str = Config.ONNX_MODEL_DIR):
+    """
+    Write an int8-quantized ONNX export of ONNX_MODEL_NAME (all-MiniLM-L6-v2) and its tokenizer to output_dir.
+    The full precision export is the one chroma distributes for its default embedding function;
+    weights are then quantized dynamically (activations are quantized at runtime).
+    Needs the onnx package, which is only required at build time.
+    """
+    from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    chroma_model = ONNXMiniLM_L6_V2()
+    chroma_model._download_model_if_not_exists()
+    source_dir = os.path.join(chroma_model.DOWNLOAD_PATH, chroma_model.EXTRACTED_FOLDER_NAME)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name in [ONNX_MODEL_FILE, *ONNX_TOKENIZER_FILES]:
+        if os.path.exists(os.path.join(source_dir, name)):
+            shutil.copy(os.path.join(source_dir, name), os.path.join(output_dir, name))
+
+    quantize_dynamic(os.path.join(output_dir, ONNX_MODEL_FILE), os.path.join(output_dir, ONNX_QUANTIZED_MODEL_FILE),
+                     weight_type=QuantType.QInt8)
+    print(f"✅ Quantized ONNX model written to {output_dir}")
+
+
+if __name__ == "__main__":
+    # Run using 'PYTHONPATH=backend python -m app.services.embedding_backends' to export the ONNX model
+    export_quantized_onnx()
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# SQLite limits the number of host parameters per statement
+SQLITE_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Texts differing only by whitespace (line breaks from OCR, indentation...) share a cache entry."""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of text embeddings, keyed by model name + SHA-256 of the normalized text.
+    - an in-process LRU of at most memory_items vectors,
+    - an on-disk SQLite store of at most disk_max_items vectors (least recently used are evicted),
+      shared by the gunicorn workers of an instance.
+    """
+
+    def __init__(self, memory_items: int, disk_path: Optional[str] = None, disk_max_items: int = 100_000):
+        self.memory_items = memory_items
+        self.disk_max_items = disk_max_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+
+        self._db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for key in unique_keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            self._stats["memory_hits"] += len(found)
+
+            missing = [key for key in unique_keys if key not in found]
+            if missing and self._db is not None:
+                from_disk = self._read_disk(missing)
+                self._stats["disk_hits"] += len(from_disk)
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                found.update(from_disk)
+            self._stats["misses"] += len(unique_keys) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            if self._db is not None:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()])
+                self._evict_disk()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_items"] = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else None
+        return stats
+
+    def _remember(self, key: str, vector: np.ndarray):
+        if self.memory_items <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for i in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = keys[i:i + SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).copy()
+            if found:
+                self._db.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                                 [time.time(), *batch])
+        return found
+
+    def _evict_disk(self):
+        count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.disk_max_items:
+            return
+        # Evict a bit more than needed so that we don't evict on every insert once full
+        excess = count - self.disk_max_items + self.disk_max_items // 10
+        self._db.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+        self._stats["disk_evictions"] += excess
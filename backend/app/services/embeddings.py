@@ -0,0 +1,103 @@
+import threading
+from typing import Any, Dict, List
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from app.config import Config
+from app.services.embedding_backends import create_encoder
+from app.services.embedding_cache import EmbeddingCache
+
+
+class EmbeddingService:
+    """
+    Owns the sentence embedding model (run by sentence-transformers or onnxruntime, see embedding_backends).
+    Clause texts are embedded once through embed() and the vectors are reused as query_embeddings for every
+    collection; embedding_function is what the collections are created with, so that documents added to them
+    go through the same model instance and cache.
+    """
+
+    def __init__(self, model_name: str = Config.EMBEDDING_MODEL, cache: EmbeddingCache | None = None,
+                 backend: str = Config.EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.cache = cache
+        self._encoder = create_encoder(model_name, backend)
+        # Quantized vectors are close to but not the same as the torch ones: keep them apart in the cache
+        self._cache_namespace = model_name if backend == "torch" else f"{model_name}:{backend}"
+        self.embedding_function = ServiceEmbeddingFunction(self)
+
+    def encode(self, texts: List[str]) -> List:
+        """Run the model, bypassing the cache."""
+        return self._encoder(list(texts))
+
+    def embed(self, texts: List[str]) -> List:
+        if not texts:
+            return []
+        if self.cache is None:
+            return self.encode(texts)
+
+        keys = [EmbeddingCache.key(self._cache_namespace, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        # Only embed each missing text once, even if it appears several times in the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = dict(zip(missing.keys(), self.encode(list(missing.values()))))
+            self.cache.put_many(encoded)
+            vectors.update(encoded)
+        return [vectors[key] for key in keys]
+
+
+class ServiceEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Chroma embedding function backed by an EmbeddingService (hence by its cache).
+    It declares itself as chroma's sentence_transformer function, which it is a drop-in for,
+    so that it can open the collections persisted with it.
+    """
+
+    def __init__(self, service: EmbeddingService):
+        self.service = service
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.service.embed(list(input))
+
+    @staticmethod
+    def name() -> str:
+        return "sentence_transformer"
+
+    def default_space(self) -> str:
+        return "cosine"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"model_name": self.service.model_name, "device": "cpu", "normalize_embeddings": False, "kwargs": {}}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "ServiceEmbeddingFunction":
+        return get_embedding_service(config["model_name"]).embedding_function
+
+
+_embedding_cache = None
+_embedding_services: Dict[str, EmbeddingService] = {}
+_embedding_services_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Process-wide embedding cache shared by all models (keys include the model name), None when disabled."""
+    global _embedding_cache
+    if _embedding_cache is None and Config.EMBEDDING_CACHE:
+        _embedding_cache = EmbeddingCache(
+            memory_items=Config.EMBEDDING_CACHE_MEMORY_ITEMS,
+            disk_path=Config.EMBEDDING_CACHE_PATH or None,
+            disk_max_items=Config.EMBEDDING_CACHE_DISK_MAX_ITEMS,
+        )
+    return _embedding_cache
+
+
+def get_embedding_service(model_name: str = Config.EMBEDDING_MODEL) -> EmbeddingService:
+    """Return the process-wide embedding service for a model, loading the model on first use."""
+    with _embedding_services_lock:
+        if model_name not in _embedding_services:
+            _embedding_services[model_name] = EmbeddingService(model_name, cache=get_embedding_cache())
+        return _embedding_services[model_name]
@@ -0,0 +1,145 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, DateTime, Index, JSON, MetaData, String, Table, delete, insert, select
+
+from app.config import Config
+from app.services.embedding_cache import normalize_text
+from app.services.extraction_cache import file_sha256
+
+# Own metadata: the cache also lives in a local SQLite file, without the app database (app.db re-exports the table)
+evaluation_cache_metadata = MetaData()
+evaluation_cache_table = Table(
+    "evaluation_cache", evaluation_cache_metadata,
+    Column("key", String(64), primary_key=True),
+    Column("model", String),
+    Column("evaluation", JSON, nullable=False),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Index("ix_evaluation_cache_created_at", "created_at"),
+)
+
+
+class EvaluationCache:
+    """
+    Cache of clause LLM evaluations, in the evaluation_cache table of a database: Postgres (shared by all
+    instances) or a local SQLite file. Entries older than ttl are ignored and purged.
+    A key covers everything the evaluation depends on (see key()), so changing the policy rules, the
+    rejections, the model or the prompt simply makes new keys, and old entries expire.
+    """
+
+    def __init__(self, engine, ttl: timedelta):
+        self.ttl = ttl
+        self._engine = engine
+        evaluation_cache_table.create(bind=engine, checkfirst=True)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    @staticmethod
+    def key(clause_text: str, rule_ids: List[str], rejection_ids: List[str], model: str, prompt_version: str,
+            policy_version: str, rejections_version: str) -> str:
+        payload = json.dumps([normalize_text(clause_text), rule_ids, rejection_ids, model, prompt_version,
+                              policy_version, rejections_version])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        unique_keys = list(dict.fromkeys(keys))
+        if not unique_keys:
+            return {}
+        table = evaluation_cache_table
+        try:
+            with self._engine.connect() as conn:
+                rows = conn.execute(select(table.c.key, table.c.evaluation).where(
+                    table.c.key.in_(unique_keys),
+                    table.c.created_at >= datetime.utcnow() - self.ttl,
+                )).all()
+            found = {key: evaluation for key, evaluation in rows}
+        except Exception as e:
+            # The cache is an optimization, the clauses are evaluated anyway
+            print(f"⚠️ Could not read LLM evaluation cache: {e}")
+            found = {}
+        with self._lock:
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(unique_keys) - len(found)
+        return found
+
+    def put_many(self, evaluations: Dict[str, dict], model: Optional[str] = None):
+        # Evaluations with made-up fields (see analyze_clause_llm) would be served until they expire
+        evaluations = {key: evaluation for key, evaluation in evaluations.items() if not evaluation.get("degraded")}
+        if not evaluations:
+            return
+        table = evaluation_cache_table
+        try:
+            with self._engine.begin() as conn:
+                # Drop expired entries along the way, and the ones being replaced
+                conn.execute(delete(table).where(
+                    (table.c.created_at < datetime.utcnow() - self.ttl) | table.c.key.in_(list(evaluations))))
+                conn.execute(insert(table), [{"key": key, "model": model, "evaluation": evaluation}
+                                             for key, evaluation in evaluations.items()])
+        except Exception as e:
+            # Concurrent writers may insert the same key: losing a cache write is fine
+            print(f"⚠️ Could not write LLM evaluation cache: {e}")
+            return
+        with self._lock:
+            self._stats["writes"] += len(evaluations)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
+
+
+_policy_version = None
+
+
+def policy_version(rules_path: str = Config.POLICY_RULES_PATH) -> str:
+    """Hash of the policy rules file, recomputed when the file changes."""
+    global _policy_version
+    if not os.path.exists(rules_path):
+        return "unknown"
+    stat = os.stat(rules_path)
+    signature = (rules_path, stat.st_mtime_ns, stat.st_size)
+    if _policy_version is None or _policy_version[0] != signature:
+        _policy_version = (signature, file_sha256(rules_path))
+    return _policy_version[1]
+
+
+def rejections_version(rejections_coll) -> str:
+    """Hash of the ids of the rejected clauses: changes when one is added, removed or replaced."""
+    ids = sorted(rejections_coll.get(include=[])["ids"])
+    return hashlib.sha256(json.dumps(ids).encode("utf-8")).hexdigest()
+
+
+# Stored instead of the cache once it failed to open: the clauses are evaluated without it from then on
+_DISABLED = "disabled"
+_evaluation_cache = None
+_evaluation_cache_lock = threading.Lock()
+
+
+def get_evaluation_cache() -> Optional[EvaluationCache]:
+    """
+    Return the process-wide LLM evaluation cache: in the app database with EVALUATION_CACHE=postgres,
+    in EVALUATION_CACHE_PATH with EVALUATION_CACHE=disk, None when disabled (empty EVALUATION_CACHE).
+    """
+    global _evaluation_cache
+    if not Config.EVALUATION_CACHE:
+        return None
+    with _evaluation_cache_lock:
+        if _evaluation_cache is None:
+            try:
+                if Config.EVALUATION_CACHE == "disk":
+                    from sqlalchemy import create_engine
+                    os.makedirs(os.path.dirname(Config.EVALUATION_CACHE_PATH) or ".", exist_ok=True)
+                    engine = create_engine(f"sqlite:///{Config.EVALUATION_CACHE_PATH}")
+                else:
+                    from app.db import engine
+                _evaluation_cache = EvaluationCache(engine, ttl=timedelta(hours=Config.EVALUATION_CACHE_TTL_HOURS))
+            except Exception as e:
+                print(f"⚠️ LLM evaluation cache unavailable, disabled: {e}")
+                _evaluation_cache = _DISABLED
+    return None if _evaluation_cache is _DISABLED else _evaluation_cache
@@ -0,0 +1,142 @@
+import os
+import re
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterator, List, Optional, Tuple, Union
+
+import pymupdf
+from pdf2image import convert_from_path
+from pytesseract import image_to_string
+
+from app.config import Config
+from app.services.extraction_cache import ExtractionCache, file_sha256, get_extraction_cache
+
+# Text layers often put the clause number and its title on separate lines ("1.\nPurpose"),
+# whereas Tesseract reads them as one line ("1. Purpose"). Join them so both segment the same way.
+CLAUSE_NUMBER_LINE_PATTERN = re.compile(r'(?m)^(\d{1,2}\.)[ \t]*\n(?=[A-Z])')
+# Resolution of the render used to hash scanned pages for the extraction cache
+PAGE_HASH_DPI = 72
+
+
+def has_usable_text_layer(text: str) -> bool:
+    """A page whose text layer is (almost) empty is most likely a scan and must be OCR'd."""
+    return len(text.strip()) >= Config.MIN_TEXT_LAYER_CHARS
+
+
+def normalize_text_layer(text: str) -> str:
+    return CLAUSE_NUMBER_LINE_PATTERN.sub(r'\1 ', text)
+
+
+def ocr_page(pdf_path: str, page_number: int, dpi: int = 200) -> str:
+    """Rasterize a single page (1-indexed) and run Tesseract on it. Runs inside the OCR worker processes."""
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    return image_to_string(images[0]) if images else ""
+
+
+def _init_ocr_worker():
+    # Each worker handles one page at a time, keep Tesseract from spawning its own threads on top of that
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+_ocr_pool = None
+
+
+def get_ocr_pool() -> ProcessPoolExecutor | None:
+    """Return the process-wide OCR pool, created lazily. None when OCR_WORKERS is 0 (OCR runs inline)."""
+    global _ocr_pool
+    if _ocr_pool is None and Config.OCR_WORKERS > 0:
+        # 'spawn' rather than 'fork': the gunicorn worker is multi-threaded and holds DB/HTTP connections
+        _ocr_pool = ProcessPoolExecutor(max_workers=Config.OCR_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_ocr_worker)
+    return _ocr_pool
+
+
+def page_render_hash(page: pymupdf.Page) -> str:
+    """Hash of a cheap low-resolution render, identifies a scanned page independently of the PDF it is in."""
+    pixmap = page.get_pixmap(dpi=PAGE_HASH_DPI)
+    return f"{hashlib.sha256(pixmap.samples).hexdigest()}-{Config.OCR_DPI}"
+
+
+def _pop_page(pending: Deque[Tuple[int, Union[str, Future], Optional[str]]], cache: Optional[ExtractionCache]) -> dict:
+    page_number, text, page_hash = pending.popleft()
+    if isinstance(text, Future):
+        text = text.result()
+        if cache and page_hash:
+            cache.put_page(page_hash, text)
+    return {
+        "page_number": page_number,
+        "text": text.strip()
+    }
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[dict]:
+    """
+    Yield {"page_number", "text"} for each page of a PDF, in order.
+    The native text layer is used when present, OCR is only run on pages without usable text.
+    Pages to OCR are rendered and recognized in the OCR process pool, with at most
+    Config.OCR_MAX_PAGES_IN_FLIGHT of them being processed (hence held in memory) at once.
+    Known PDFs and already OCR'd pages are served from the extraction cache.
+    Closing the generator early cancels its OCR pages that are still queued in the pool.
+    """
+    cache = get_extraction_cache()
+    pdf_hash = None
+    if cache:
+        pdf_hash = file_sha256(pdf_path)
+        cached_pages = cache.get_document(pdf_hash)
+        if cached_pages is not None:
+            yield from cached_pages
+            return
+
+    pool = get_ocr_pool()
+    pending: Deque[Tuple[int, Union[str, Future], Optional[str]]] = deque()
+    in_flight = 0
+    pages = []
+
+    try:
+        with pymupdf.open(pdf_path) as doc:
+            for index, page in enumerate(doc):
+                page_number = index + 1
+                text = page.get_text()
+                page_hash = None
+                if has_usable_text_layer(text):
+                    text = normalize_text_layer(text)
+                elif cache and (cached_text := cache.get_page(page_hash := page_render_hash(page))) is not None:
+                    text = cached_text
+                elif pool is None:
+                    text = ocr_page(pdf_path, page_number, Config.OCR_DPI)
+                    if cache:
+                        cache.put_page(page_hash, text)
+                else:
+                    # Wait for the oldest OCR pages before rendering a new one
+                    while in_flight >= Config.OCR_MAX_PAGES_IN_FLIGHT:
+                        in_flight -= isinstance(pending[0][1], Future)
+                        pages.append(_pop_page(pending, cache))
+                        yield pages[-1]
+                    text = pool.submit(ocr_page, pdf_path, page_number, Config.OCR_DPI)
+                    in_flight += 1
+                pending.append((page_number, text, page_hash))
+
+                # Hand out every page that is already available, keeping the original page order
+                while pending and (not isinstance(pending[0][1], Future) or pending[0][1].done()):
+                    in_flight -= isinstance(pending[0][1], Future)
+                    pages.append(_pop_page(pending, cache))
+                    yield pages[-1]
+
+        while pending:
+            pages.append(_pop_page(pending, cache))
+            yield pages[-1]
+
+        if cache:
+            cache.put_document(pdf_hash, pages)
+    finally:
+        # The consumer went away (or extraction failed): free the OCR workers of the pages not started yet
+        for _, text, _ in pending:
+            if isinstance(text, Future):
+                text.cancel()
+
+
+def extract_pages(pdf_path: str) -> List[dict]:
+    return list(iter_pdf_pages(pdf_path))
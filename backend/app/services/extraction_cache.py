@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Optional
+
+from app.config import Config
+from app.services.storage import download_from_gcs, upload_to_gcs
+
+# Bump when extraction output changes for the same input (normalization, OCR settings...)
+EXTRACTION_CACHE_VERSION = "v1"
+GCS_CACHE_PREFIX = "cache/extraction"
+# A key missing from the bucket is not looked up there again for this long (other instances may add it later)
+GCS_MISS_TTL_SECONDS = 300
+GCS_MISSES_MAX = 100_000
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of extracted text.
+    - "documents" entries: SHA-256 of the PDF bytes -> list of {"page_number", "text"}.
+    - "pages" entries: hash of a rendered page -> its OCR text, so a known page is not OCR'd again
+      even when it shows up in a different PDF (same template, different signature page...).
+    Entries live on local disk with LRU eviction above max_bytes, and optionally in a GCS bucket
+    shared by all instances: a local miss downloads the entry once (concurrent lookups of a key wait for it)
+    and a key missing from the bucket is remembered for GCS_MISS_TTL_SECONDS.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, gcs_bucket: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.gcs_bucket = gcs_bucket
+        self._lock = threading.Lock()
+        self._downloads = {}
+        self._gcs_misses = {}
+        self._stats = {"document_hits": 0, "document_misses": 0, "page_hits": 0, "page_misses": 0,
+                       "gcs_hits": 0, "evictions": 0}
+
+        for kind in ("documents", "pages"):
+            os.makedirs(os.path.join(cache_dir, kind), exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    def get_document(self, pdf_hash: str) -> Optional[list]:
+        return self._get("documents", pdf_hash)
+
+    def put_document(self, pdf_hash: str, pages: list):
+        self._put("documents", pdf_hash, pages)
+
+    def get_page(self, page_hash: str) -> Optional[str]:
+        return self._get("pages", page_hash)
+
+    def put_page(self, page_hash: str, text: str):
+        self._put("pages", page_hash, text)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size_bytes"] = self._size
+        for kind in ("document", "page"):
+            lookups = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+            stats[f"{kind}_hit_rate"] = round(stats[f"{kind}_hits"] / lookups, 3) if lookups else None
+        return stats
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.cache_dir, kind, f"{EXTRACTION_CACHE_VERSION}-{key}.json")
+
+    def _blob_name(self, kind: str, key: str) -> str:
+        return f"{GCS_CACHE_PREFIX}/{kind}/{EXTRACTION_CACHE_VERSION}-{key}.json"
+
+    def _entries(self):
+        for kind in ("documents", "pages"):
+            directory = os.path.join(self.cache_dir, kind)
+            for name in os.listdir(directory):
+                if name.endswith(".json"):
+                    yield os.path.join(directory, name)
+
+    def _get(self, kind: str, key: str) -> Optional[Any]:
+        counter = "document" if kind == "documents" else "page"
+        path = self._path(kind, key)
+
+        if not os.path.exists(path) and self.gcs_bucket:
+            self._download(kind, key, path)
+
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+            # Touch the entry so that eviction drops the least recently used ones first
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats[f"{counter}_misses"] += 1
+            return None
+
+        with self._lock:
+            self._stats[f"{counter}_hits"] += 1
+        return value
+
+    def _download(self, kind: str, key: str, path: str):
+        blob_name = self._blob_name(kind, key)
+        with self._lock:
+            if self._missed_in_gcs(blob_name):
+                return
+            download_lock = self._downloads.setdefault(blob_name, threading.Lock())
+
+        with download_lock:
+            try:
+                with self._lock:
+                    # Downloaded (or not found) by a concurrent lookup
+                    if os.path.exists(path) or self._missed_in_gcs(blob_name):
+                        return
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                try:
+                    download_from_gcs(self.gcs_bucket, blob_name, tmp_path)
+                except Exception:
+                    # Not in the bucket (or bucket unreachable): plain miss
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    with self._lock:
+                        if len(self._gcs_misses) >= GCS_MISSES_MAX:
+                            self._gcs_misses.clear()
+                        self._gcs_misses[blob_name] = time.monotonic()
+                    return
+                self._replace(tmp_path, path)
+                with self._lock:
+                    self._stats["gcs_hits"] += 1
+            finally:
+                with self._lock:
+                    self._downloads.pop(blob_name, None)
+        self._evict()
+
+    def _missed_in_gcs(self, blob_name: str) -> bool:
+        missed_at = self._gcs_misses.get(blob_name)
+        return missed_at is not None and time.monotonic() - missed_at < GCS_MISS_TTL_SECONDS
+
+    def _replace(self, tmp_path: str, path: str):
+        """Moves tmp_path to path, counting only the size it adds to the cache."""
+        with self._lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._size += os.path.getsize(path) - previous_size
+
+    def _put(self, kind: str, key: str, value: Any):
+        path = self._path(kind, key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        self._replace(tmp_path, path)
+        self._evict()
+
+        if self.gcs_bucket:
+            with self._lock:
+                self._gcs_misses.pop(self._blob_name(kind, key), None)
+            try:
+                upload_to_gcs(self.gcs_bucket, path, self._blob_name(kind, key), make_public=False)
+            except Exception as e:
+                print(f"⚠️ Could not upload extraction cache entry to GCS: {e}")
+
+    def _evict(self):
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            entries = sorted(self._entries(), key=lambda p: os.path.getmtime(p))
+            for path in entries:
+                if self._size <= self.max_bytes:
+                    break
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+                self._stats["evictions"] += 1
+
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Return the process-wide extraction cache, None when disabled (empty EXTRACTION_CACHE_DIR)."""
+    global _extraction_cache
+    if not Config.EXTRACTION_CACHE_DIR:
+        return None
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache(
+                Config.EXTRACTION_CACHE_DIR,
+                max_bytes=Config.EXTRACTION_CACHE_MAX_MB * 1024 * 1024,
+                gcs_bucket=Config.GCS_BUCKET if Config.EXTRACTION_CACHE_GCS else None,
+            )
+    return _extraction_cache
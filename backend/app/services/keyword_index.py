@@ -0,0 +1,165 @@
+import os
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from app.config import Config
+
+KEYWORD_INDEX_FILE = "keyword_index.json"
+KEYWORD_KINDS = ("keywords", "anti_keywords")
+
+
+class KeywordIndex:
+    """
+    Aho-Corasick automaton over the detection_hints of all policy rules (keywords_any / anti_keywords_any).
+    scan() finds every hint occurring in a clause in a single pass over its text, whatever the number of
+    rules, and groups them by rule. Matching is case-insensitive, ignores line breaks and only starts
+    at word boundaries ("assign" matches "assignment", not "reassign").
+    """
+
+    def __init__(self, hints: Dict[str, Dict[str, List[str]]], policy_version: Optional[str] = None):
+        # rule id -> {"keywords": [...], "anti_keywords": [...]}
+        self.hints = hints
+        # Version of the policy rules the hints come from (see policy_version), None if unknown
+        self.policy_version = policy_version
+        # Trie nodes: children, failure link, and the (rule id, kind, keyword, length) ending at the node
+        self._children: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[str, str, str, int]]] = [[]]
+
+        for rule_id, rule_hints in hints.items():
+            for kind in KEYWORD_KINDS:
+                for keyword in rule_hints.get(kind, []):
+                    pattern = self._normalize(keyword)
+                    if pattern:
+                        self._add(pattern, (rule_id, kind, keyword, len(pattern)))
+        self._build_failure_links()
+
+    @classmethod
+    def from_rules(cls, rules: List[dict], policy_version: Optional[str] = None) -> "KeywordIndex":
+        hints = {}
+        for rule in rules:
+            detection_hints = rule.get("detection_hints") or {}
+            hints[rule["id"]] = {"keywords": list(detection_hints.get("keywords_any", [])),
+                                 "anti_keywords": list(detection_hints.get("anti_keywords_any", []))}
+        return cls(hints, policy_version)
+
+    @classmethod
+    def from_rules_file(cls, rules_path: str) -> "KeywordIndex":
+        from app.services.evaluation_cache import policy_version
+
+        with open(rules_path, "r") as f:
+            return cls.from_rules(json.load(f), policy_version(rules_path))
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, KEYWORD_INDEX_FILE))
+
+    def save(self, persist_dir: str):
+        os.makedirs(persist_dir, exist_ok=True)
+        with open(os.path.join(persist_dir, KEYWORD_INDEX_FILE), "w") as f:
+            json.dump({"policy_version": self.policy_version, "hints": self.hints}, f)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "KeywordIndex":
+        with open(os.path.join(persist_dir, KEYWORD_INDEX_FILE), "r") as f:
+            saved = json.load(f)
+        if "hints" not in saved:
+            # Saved before the policy version was recorded
+            return cls(saved)
+        return cls(saved["hints"], saved["policy_version"])
+
+    def scan(self, text: str) -> Dict[str, Dict[str, List[str]]]:
+        """Rule id -> {"keywords": [...], "anti_keywords": [...]} for the rules with at least one hit."""
+        text = self._normalize(text)
+        hits: Dict[str, Dict[str, List[str]]] = {}
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self._children[node]:
+                node = self._fail[node]
+            node = self._children[node].get(char, 0)
+            for rule_id, kind, keyword, length in self._outputs[node]:
+                start = position - length + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                rule_hits = hits.setdefault(rule_id, {kind: [] for kind in KEYWORD_KINDS})
+                if keyword not in rule_hits[kind]:
+                    rule_hits[kind].append(keyword)
+        return hits
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.split()).casefold()
+
+    def _add(self, pattern: str, output: Tuple[str, str, str, int]):
+        node = 0
+        for char in pattern:
+            if char not in self._children[node]:
+                self._children.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._children[node][char] = len(self._children) - 1
+            node = self._children[node][char]
+        self._outputs[node].append(output)
+
+    def _build_failure_links(self):
+        queue = deque(self._children[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._children[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._children[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._children[fail].get(char, 0)
+                # A node also outputs the patterns ending at its longest proper suffix
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+
+_keyword_index = None
+_keyword_index_dir = None
+_keyword_index_signature = None
+_keyword_index_lock = threading.Lock()
+
+
+def _signature(persist_dir: str) -> Optional[tuple]:
+    if not KeywordIndex.exists(persist_dir):
+        return None
+    stat = os.stat(os.path.join(persist_dir, KEYWORD_INDEX_FILE))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_keyword_index(persist_dir: str) -> Optional[KeywordIndex]:
+    """
+    Make the keyword index saved in persist_dir the process-wide one (load_vectorstore loads it next to the
+    policy rules). When it was built from other policy rules than POLICY_RULES_PATH (or is missing), it is
+    built again from POLICY_RULES_PATH and saved. None when disabled.
+    """
+    from app.services.evaluation_cache import policy_version
+
+    global _keyword_index, _keyword_index_dir, _keyword_index_signature
+    if not Config.KEYWORD_INDEX:
+        return None
+    with _keyword_index_lock:
+        signature = (policy_version(Config.POLICY_RULES_PATH), _signature(persist_dir))
+        if persist_dir == _keyword_index_dir and signature == _keyword_index_signature:
+            return _keyword_index
+        version, saved = signature
+        index = KeywordIndex.load(persist_dir) if saved else None
+        if version != "unknown" and (index is None or index.policy_version != version):
+            print(f"Building keyword index from {Config.POLICY_RULES_PATH} (policy rules changed)...")
+            index = KeywordIndex.from_rules_file(Config.POLICY_RULES_PATH)
+            index.save(persist_dir)
+            signature = (version, _signature(persist_dir))
+        _keyword_index, _keyword_index_dir, _keyword_index_signature = index, persist_dir, signature
+    return _keyword_index
+
+
+def get_keyword_index() -> Optional[KeywordIndex]:
+    """
+    Return the process-wide keyword index, from the directory of the last loaded policy vectorstore
+    (VECTORSTORE_DIR until then). It is built again when the policy rules change, loaded again when the saved
+    index changes.
+    """
+    return load_keyword_index(_keyword_index_dir or Config.VECTORSTORE_DIR)
@@ -1,16 +1,223 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Deque, Hashable, Iterator
+
 import openai
 from app.config import Config
+from app.services.llm_providers import get_llm_provider
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and server side errors
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                    openai.InternalServerError)
+
+# Queue of the LLM requests of the current task, requests of different queues are served round-robin across the
+# process (see FairSemaphore): one queue per analysis (its event loop) by default, per document in bulk analyses
+llm_queue_key: ContextVar[Hashable] = ContextVar("llm_queue_key", default=None)
+
+
+class FairSemaphore:
+    """
+    Bounds the number of requests in flight like asyncio.Semaphore, but a freed slot goes to the queues
+    (llm_queue_key of the waiting tasks) in turn rather than to the oldest waiter, so that a document with
+    many clauses doesn't hold back the requests of the others. Within a queue, first come first served.
+    """
+
+    def __init__(self, value: int):
+        self.limit = value
+        self._value = value
+        self._waiters: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()
+
+    async def acquire(self):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        key = llm_queue_key.get()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Cancelled right after being handed a slot: hand it to the next waiter
+                self.release()
+            elif key in self._waiters and waiter in self._waiters[key]:
+                self._waiters[key].remove(waiter)
+                if not self._waiters[key]:
+                    del self._waiters[key]
+            raise
+
+    def release(self):
+        while self._waiters:
+            key, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            # Served queue goes last
+            if waiters:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            # Cancelled waiters are skipped
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._value += 1
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+class LLMLoop:
+    """
+    Event loop thread running the async LLM requests of the whole process, whatever the event loop of the
+    analysis that made them: they share one client (and its connection pool) and one concurrency limit.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-loop", daemon=True)
+        self.thread.start()
+
+    async def run(self, coro):
+        """Awaits coro run in the LLM loop. Cancelling the caller cancels it."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+_llm_loop = None
+_llm_loop_lock = threading.Lock()
+
+
+def get_llm_loop() -> LLMLoop:
+    global _llm_loop
+    with _llm_loop_lock:
+        # Threads don't survive a fork
+        if _llm_loop is None or _llm_loop.pid != os.getpid():
+            _llm_loop = LLMLoop()
+    return _llm_loop
+
+
+# Limits apply to every provider, so that a fake one is loaded like OpenAI would be
+_semaphore = None
+
+
+def get_llm_semaphore() -> FairSemaphore:
+    """
+    Bounds the number of LLM requests in flight in the process, to be used in the LLM loop.
+    Made again when OPENAI_MAX_CONCURRENCY changes (benchmarks), requests in flight release their own.
+    """
+    global _semaphore
+    if _semaphore is None or _semaphore.limit != Config.OPENAI_MAX_CONCURRENCY:
+        _semaphore = FairSemaphore(Config.OPENAI_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying: the server's Retry-After when it sends one,
+    otherwise exponential backoff with full jitter, so that concurrent callers don't retry in lockstep.
+    """
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000 + random.uniform(0, 0.1)
+        if "retry-after" in headers:
+            return float(headers["retry-after"]) + random.uniform(0, 0.1)
+    except ValueError:
+        # Retry-After given as a date: fall back to backoff
+        pass
+    return random.uniform(0, min(Config.OPENAI_RETRY_MAX_DELAY, Config.OPENAI_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def chat_completion_async(**kwargs) -> str:
+    """
+    Answer text of a chat completion request (chat.completions.create arguments) from the LLM provider,
+    run in the LLM loop, limited by its semaphore and retried on transient errors.
+    """
+    # Without a queue of their own, the requests of an analysis share the queue of its event loop
+    queue_key = llm_queue_key.get()
+    if queue_key is None:
+        queue_key = asyncio.get_running_loop()
+    return await get_llm_loop().run(_chat_completion_async(queue_key, kwargs))
+
+
+async def _chat_completion_async(queue_key: Hashable, kwargs: dict) -> str:
+    llm_queue_key.set(queue_key)
+    provider = get_llm_provider()
+    semaphore = get_llm_semaphore()
+    for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+        try:
+            # The slot is only held during the request, not while waiting to retry
+            async with semaphore:
+                return await provider.acomplete(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == Config.OPENAI_MAX_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            print(f"⚠️ {type(e).__name__} from {provider.name}, retrying in {delay:.1f}s ({attempt + 1}/{Config.OPENAI_MAX_RETRIES})")
+            await asyncio.sleep(delay)
+
+
+def chat_completion(**kwargs) -> str:
+    """Sync counterpart of chat_completion_async."""
+    provider = get_llm_provider()
+    for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+        try:
+            return provider.complete(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == Config.OPENAI_MAX_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            print(f"⚠️ {type(e).__name__} from {provider.name}, retrying in {delay:.1f}s ({attempt + 1}/{Config.OPENAI_MAX_RETRIES})")
+            time.sleep(delay)
+
+
+def chat_messages(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "You are a legal assistant specialized in NDA analysis."},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def stream_llm(prompt: str | None = None, model="gpt-4o-mini", temperature=0.3,
+               messages: list | None = None) -> Iterator[str]:
+    """
+    Same as call_llm, yielding the answer as it is generated. Failures before the first token are retried
+    like any call, tokens can't be retried once they were sent. Closing the generator (e.g. the client went
+    away) closes the provider's stream, which stops the generation.
+    """
+    provider = get_llm_provider()
+    request = dict(model=model, messages=messages or chat_messages(prompt), temperature=temperature)
+    for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+        tokens = provider.stream(**request)
+        started = False
+        try:
+            for token in tokens:
+                started = True
+                yield token
+            return
+        except RETRYABLE_ERRORS as e:
+            if started or attempt == Config.OPENAI_MAX_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            print(f"⚠️ {type(e).__name__} from {provider.name}, retrying in {delay:.1f}s ({attempt + 1}/{Config.OPENAI_MAX_RETRIES})")
+            time.sleep(delay)
+        finally:
+            tokens.close()
 
 
-def call_llm(prompt: str, model="gpt-4o-mini", temperature=0.3) -> str:
-    """Wrapper simple pour OpenAI complet."""
-    client = openai.Client(api_key=Config.OPENAI_API_KEY)
-    response = client.chat.completions.create(
+def call_llm(prompt: str | None = None, model="gpt-4o-mini", temperature=0.3, messages: list | None = None) -> str:
+    """Wrapper simple pour OpenAI complet (prompt seul, ou messages déjà construits)."""
+    answer = chat_completion(
         model=model,
-        messages=[
-            {"role": "system", "content": "You are a legal assistant specialized in NDA analysis."},
-            {"role": "user", "content": prompt},
-        ],
+        messages=messages or chat_messages(prompt),
         temperature=temperature
     )
-    return response.choices[0].message.content.strip()
+    return answer.strip()
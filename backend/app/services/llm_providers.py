@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Iterator, List, Optional
+
+import httpx
+import openai
+from app.config import Config
+
+
+class LLMProvider(ABC):
+    """
+    Chat completion backend. Requests are given as chat.completions.create keyword arguments
+    (model, messages, temperature, response_format), answers are returned as text.
+    Transient failures are raised as openai errors (see llm.RETRYABLE_ERRORS) so that callers retry them
+    the same way whatever the provider.
+    """
+    name = "base"
+
+    @abstractmethod
+    def complete(self, **request) -> str:
+        ...
+
+    @abstractmethod
+    async def acomplete(self, **request) -> str:
+        ...
+
+    @abstractmethod
+    def stream(self, **request) -> Iterator[str]:
+        """Yields the answer as it is generated. Closing the generator must stop the generation."""
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=Config.OPENAI_MAX_CONCURRENCY,
+                        max_keepalive_connections=Config.OPENAI_MAX_CONCURRENCY)
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self):
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._async_client = None
+
+    def client(self) -> openai.Client:
+        """Sync client of the provider, its connections are kept alive between /chat requests."""
+        with self._client_lock:
+            if self._client is None:
+                self._client = openai.Client(
+                    api_key=Config.OPENAI_API_KEY, timeout=Config.OPENAI_TIMEOUT, max_retries=0,
+                    http_client=openai.DefaultHttpxClient(limits=http_limits()))
+        return self._client
+
+    def async_client(self) -> openai.AsyncOpenAI:
+        """
+        Async client of the provider. Its connection pool is bound to the event loop it is first used in:
+        acomplete is only awaited in the LLM loop (see llm.chat_completion_async).
+        """
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=Config.OPENAI_API_KEY, timeout=Config.OPENAI_TIMEOUT, max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(limits=http_limits()))
+        return self._async_client
+
+    def complete(self, **request) -> str:
+        return self.client().chat.completions.create(**request).choices[0].message.content
+
+    async def acomplete(self, **request) -> str:
+        response = await self.async_client().chat.completions.create(**request)
+        return response.choices[0].message.content
+
+    def stream(self, **request) -> Iterator[str]:
+        stream = self.client().chat.completions.create(**request, stream=True)
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closes the HTTP response, which stops the generation on OpenAI's side
+            stream.close()
+
+
+def fake_value(schema: dict, prompt: str, key: str = "", index: int = 0):
+    """
+    Deterministic value matching a JSON schema: enum values are picked from a hash of the prompt, arrays get
+    one item per "Clause <n>:" of the prompt (batched evaluations) and integers the index of their item.
+    """
+    if "enum" in schema:
+        digest = hashlib.sha256(f"{prompt}|{key}|{index}".encode("utf-8")).digest()
+        return schema["enum"][digest[0] % len(schema["enum"])]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fake_value(sub_schema, prompt, name, index)
+                for name, sub_schema in schema.get("properties", {}).items()}
+    if kind == "array":
+        indices = [int(i) for i in re.findall(r"^\s*Clause (\d+):", prompt, re.MULTILINE)] or [0]
+        return [fake_value(schema.get("items", {}), prompt, key, i) for i in indices]
+    if kind in ("integer", "number"):
+        return index
+    if kind == "boolean":
+        return False
+    return f"Fake {key or 'value'}"
+
+
+def fake_answer(request: dict) -> str:
+    """Default answer of FakeProvider: JSON following the requested schema, or a short text."""
+    prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+    response_format = request.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(fake_value(response_format["json_schema"]["schema"], prompt))
+    if response_format.get("type") == "json_object":
+        return "{}"
+    return f"Fake answer to a {len(prompt)} characters prompt."
+
+
+class FakeProvider(LLMProvider):
+    """
+    In-process stand-in for load tests and benchmarks: answers with responder(request) (fake_answer by default)
+    after latency seconds plus one "token" (word) per 1 / tokens_per_second seconds, and fails with a 429 rate
+    limit error for an error_rate share of the requests, drawn from a seeded generator.
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = 0.5, tokens_per_second: float = 100, error_rate: float = 0,
+                 seed: int = 0, responder: Optional[Callable[[dict], str]] = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.responder = responder or fake_answer
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _answer(self, request: dict) -> List[str]:
+        with self._random_lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            fake_request = httpx.Request("POST", "http://fake-llm/v1/chat/completions")
+            raise openai.RateLimitError("Fake rate limit", response=httpx.Response(429, request=fake_request),
+                                        body=None)
+        return re.findall(r"\S+\s*|\s+", self.responder(request))
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+
+    def complete(self, **request) -> str:
+        tokens = self._answer(request)
+        time.sleep(self.latency + len(tokens) * self._token_delay())
+        return "".join(tokens)
+
+    async def acomplete(self, **request) -> str:
+        tokens = self._answer(request)
+        await asyncio.sleep(self.latency + len(tokens) * self._token_delay())
+        return "".join(tokens)
+
+    def stream(self, **request) -> Iterator[str]:
+        tokens = self._answer(request)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(self._token_delay())
+            yield token
+
+
+class ReplayMissError(LookupError):
+    """No recorded answer for a request in replay mode."""
+
+
+class RecordReplayProvider(LLMProvider):
+    """
+    Wraps a provider to record its answers, one JSON file per request in directory (named after a hash of the
+    request), or serves the recorded answers without calling it, so that runs can be repeated offline.
+    In replay mode, requests that were not recorded raise ReplayMissError.
+    """
+
+    def __init__(self, provider: LLMProvider, directory: str, mode: str, replay_latency: bool = False):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown LLM record mode: {mode}")
+        self.provider = provider
+        self.directory = directory
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.name = f"{provider.name}+{mode}"
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(request: dict) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, request: dict) -> dict:
+        key = self.key(request)
+        try:
+            with open(self._path(key), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ReplayMissError(f"No recorded answer for request {key[:12]} in {self.directory}") from None
+
+    def _save(self, request: dict, tokens: List[str], elapsed: float):
+        record = {"request": request, "content": "".join(tokens), "tokens": tokens, "elapsed": round(elapsed, 3)}
+        # Written to a temporary file then renamed, so that a concurrent replay never reads half a file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f, default=str)
+        os.replace(tmp_path, self._path(self.key(request)))
+
+    def complete(self, **request) -> str:
+        if self.mode == "replay":
+            record = self._load(request)
+            if self.replay_latency:
+                time.sleep(record["elapsed"])
+            return record["content"]
+        start = time.perf_counter()
+        content = self.provider.complete(**request)
+        self._save(request, [content], time.perf_counter() - start)
+        return content
+
+    async def acomplete(self, **request) -> str:
+        if self.mode == "replay":
+            record = self._load(request)
+            if self.replay_latency:
+                await asyncio.sleep(record["elapsed"])
+            return record["content"]
+        start = time.perf_counter()
+        content = await self.provider.acomplete(**request)
+        self._save(request, [content], time.perf_counter() - start)
+        return content
+
+    def stream(self, **request) -> Iterator[str]:
+        if self.mode == "replay":
+            record = self._load(request)
+            delay = record["elapsed"] / max(len(record["tokens"]), 1) if self.replay_latency else 0
+            for token in record["tokens"]:
+                time.sleep(delay)
+                yield token
+            return
+        start = time.perf_counter()
+        tokens = []
+        upstream = self.provider.stream(**request)
+        try:
+            for token in upstream:
+                tokens.append(token)
+                yield token
+        finally:
+            upstream.close()
+        # Only complete answers are recorded
+        self._save(request, tokens, time.perf_counter() - start)
+
+
+def create_llm_provider(name: str | None = None) -> LLMProvider:
+    """Provider named name (LLM_PROVIDER by default), wrapped for record/replay when LLM_RECORD_MODE is set."""
+    name = name or Config.LLM_PROVIDER
+    if name == "openai":
+        provider = OpenAIProvider()
+    elif name == "fake":
+        provider = FakeProvider(Config.LLM_FAKE_LATENCY, Config.LLM_FAKE_TOKENS_PER_SECOND,
+                                Config.LLM_FAKE_ERROR_RATE, Config.LLM_FAKE_SEED)
+    else:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    if Config.LLM_RECORD_MODE:
+        provider = RecordReplayProvider(provider, Config.LLM_RECORDINGS_DIR, Config.LLM_RECORD_MODE,
+                                        Config.LLM_REPLAY_LATENCY)
+    return provider
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_llm_provider() -> LLMProvider:
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_llm_provider()
+            print(f"LLM provider: {_provider.name}")
+    return _provider
+
+
+def set_llm_provider(provider: LLMProvider):
+    """Replaces the process-wide provider, e.g. by a FakeProvider in benchmarks."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,103 @@
+import os
+import json
+from typing import List, Optional
+
+import numpy as np
+
+from app.config import Config
+from app.services.embeddings import get_embedding_service
+
+POLICY_INDEX_FILE = "policy_index.npy"
+POLICY_INDEX_METADATA_FILE = "policy_index.json"
+
+
+class PolicyIndex:
+    """
+    In-memory index of the policy rules: their (normalized) embeddings in one contiguous float32 matrix,
+    queried with exact top-k through a single matrix multiply per batch of clauses.
+    query() mirrors chromadb's Collection.query so the index can be used wherever the policy collection was.
+    """
+
+    def __init__(self, embeddings: np.ndarray, ids: List[str], documents: List[str], metadatas: List[dict],
+                 model_name: str = Config.EMBEDDING_MODEL):
+        self.embeddings = embeddings
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.model_name = model_name
+        self._positions = {rule_id: i for i, rule_id in enumerate(ids)}
+
+    @classmethod
+    def from_embeddings(cls, embeddings, ids: List[str], documents: List[str], metadatas: List[dict],
+                        model_name: str = Config.EMBEDDING_MODEL) -> "PolicyIndex":
+        matrix = np.array(embeddings, dtype=np.float32, order="C")
+        # Unit vectors: the dot product is the cosine similarity
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return cls(matrix, ids, documents, metadatas, model_name)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return (os.path.exists(os.path.join(persist_dir, POLICY_INDEX_FILE))
+                and os.path.exists(os.path.join(persist_dir, POLICY_INDEX_METADATA_FILE)))
+
+    def save(self, persist_dir: str):
+        os.makedirs(persist_dir, exist_ok=True)
+        np.save(os.path.join(persist_dir, POLICY_INDEX_FILE), self.embeddings)
+        with open(os.path.join(persist_dir, POLICY_INDEX_METADATA_FILE), "w") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+            }, f)
+
+    @classmethod
+    def load(cls, persist_dir: str, mmap: bool = True) -> "PolicyIndex":
+        embeddings = np.load(os.path.join(persist_dir, POLICY_INDEX_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(persist_dir, POLICY_INDEX_METADATA_FILE), "r") as f:
+            meta = json.load(f)
+        if meta["model_name"] != Config.EMBEDDING_MODEL:
+            print(f"⚠️ Policy index was built with {meta['model_name']}, queries use {Config.EMBEDDING_MODEL}.")
+        return cls(embeddings, meta["ids"], meta["documents"], meta["metadatas"], meta["model_name"])
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get(self, ids: List[str], include: Optional[List[str]] = None) -> dict:
+        """Rules by id, shaped like chromadb's Collection.get (unknown ids are skipped)."""
+        include = include or ["documents", "metadatas"]
+        positions = [self._positions[rule_id] for rule_id in ids if rule_id in self._positions]
+        result = {"ids": [self.ids[i] for i in positions]}
+        if "documents" in include:
+            result["documents"] = [self.documents[i] for i in positions]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[i] for i in positions]
+        if "embeddings" in include:
+            result["embeddings"] = self.embeddings[positions]
+        return result
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Optional[List] = None,
+              n_results: int = 10) -> dict:
+        if query_embeddings is None:
+            query_embeddings = get_embedding_service(self.model_name).embed(query_texts)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.embeddings.shape[1])
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        similarities = queries @ self.embeddings.T
+        k = min(n_results, self.count())
+        if k < self.count():
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(self.count()), (len(queries), 1))
+        # Order the top-k of each query by decreasing similarity
+        order = np.take_along_axis(similarities, top, axis=1).argsort(axis=1)[:, ::-1]
+        top = np.take_along_axis(top, order, axis=1)
+
+        return {
+            "ids": [[self.ids[i] for i in row] for row in top],
+            "documents": [[self.documents[i] for i in row] for row in top],
+            "metadatas": [[self.metadatas[i] for i in row] for row in top],
+            "distances": [[float(1 - similarities[q, i]) for i in row] for q, row in enumerate(top)],
+        }
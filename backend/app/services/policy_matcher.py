@@ -1,25 +1,54 @@
 import os
 import asyncio
+import hashlib
 import json
 import chromadb
-from typing import List, Any, Tuple
-from chromadb.utils import embedding_functions
-from openai import AsyncOpenAI
-from pdf2image import convert_from_path
-from pytesseract import image_to_string
+from typing import AsyncIterator, Callable, Iterator, List, Any, Tuple
 import re
+import threading
+from bisect import bisect_left
 from dataclasses import dataclass
 
-from app.config import RETRIEVED_POLICIES_COUNT, CLAUSE_STATUS, POLICY_SEVERITIES
-from app.services.rejections_vectorstore import search_similar_rejections
+import numpy as np
 
+from app.config import Config, RETRIEVED_POLICIES_COUNT, CLAUSE_STATUS, POLICY_SEVERITIES
+from app.services.rejections_vectorstore import search_similar_rejections_batch
+from app.services.extraction import extract_pages, iter_pdf_pages
+from app.services.embeddings import EmbeddingService, get_embedding_service
+from app.services.policy_index import PolicyIndex
+from app.services.keyword_index import KeywordIndex, get_keyword_index, load_keyword_index
+from app.services.llm import chat_completion_async
+from app.services.rule_classifier import get_rule_classifier
+from app.services.evaluation_cache import (EvaluationCache, get_evaluation_cache, policy_version,
+                                           rejections_version)
 
-# WARNING : Needs to install poppler for pdf2image to work and torch for sentence_transformers
+
+# WARNING : Needs to install poppler for pdf2image to work and torch for sentence_transformers (unless EMBEDDING_BACKEND=onnx)
 # (in docker : cf. https://stackoverflow.com/questions/78243381/how-to-include-poppler-for-docker-build
 # or minidocks/poppler)
 
 # TODO : Create also a vectorstore for clauses and use it to find similar clauses in past NDAs
 
+EVALUATION_MODEL = "gpt-4.1-mini"
+# Bump when the prompt of analyze_clause_llm changes, so that cached evaluations are not reused
+EVALUATION_PROMPT_VERSION = "v2"
+# Same for the batched prompt of analyze_clauses_batch_llm: its evaluations are cached under their own keys
+BATCH_PROMPT_VERSION = "v1"
+EVALUATION_FIELDS = ["best_rule", "severity", "status", "reason"]
+
+
+def analysis_version(rejections_coll=None) -> str:
+    """
+    What the analysis of a document depends on besides the document: policy rules, models, prompt and,
+    given their collection, the rejected clauses (like the evaluation cache keys).
+    """
+    parts = [policy_version(), Config.EMBEDDING_MODEL, EVALUATION_MODEL, EVALUATION_PROMPT_VERSION,
+             BATCH_PROMPT_VERSION]
+    if rejections_coll is not None:
+        parts.append(rejections_version(rejections_coll))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
 @dataclass
 class Clause:
     title: str
@@ -31,7 +60,7 @@ class Clause:
 
 
 def create_vectorstore(rules_path: str = "policyRules.json", persist_dir: str = "./policy_vectorstore",
-                       collection_name: str = "policy_rules", embedding_model: str = "all-MiniLM-L6-v2"):
+                       collection_name: str = "policy_rules", embedding_model: str = Config.EMBEDDING_MODEL):
     if not os.path.exists(rules_path):
         raise FileNotFoundError(f"Policy rules file not found: {rules_path}")
 
@@ -41,7 +70,7 @@ def create_vectorstore(rules_path: str = "policyRules.json", persist_dir: str =
     os.makedirs(persist_dir, exist_ok=True)
 
     client = chromadb.PersistentClient(path=persist_dir)
-    emb_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=embedding_model)
+    emb_fn = get_embedding_service(embedding_model).embedding_function
     collection = client.get_or_create_collection(name=collection_name, embedding_function=emb_fn)
 
     try:
@@ -75,48 +104,301 @@ def create_vectorstore(rules_path: str = "policyRules.json", persist_dir: str =
             "category": rule.get("category", "unknown")
         })
 
-    collection.add(ids=ids, documents=docs, metadatas=metadatas)
+    embeddings = get_embedding_service(embedding_model).embed(docs)
+    collection.add(ids=ids, documents=docs, metadatas=metadatas, embeddings=embeddings)
     print(
         f"Indexed {len(ids)} policy rules into the vector store into '{collection_name}' (persisted at '{persist_dir}').")
 
+    # Same embeddings as a memory-mappable matrix for the in-memory index
+    PolicyIndex.from_embeddings(embeddings, ids, docs, metadatas, model_name=embedding_model).save(persist_dir)
+    print(f"Saved policy index ({len(ids)} rules) to '{persist_dir}'.")
+    KeywordIndex.from_rules(rules, policy_version(rules_path)).save(persist_dir)
+
     # TODO: Add sanity check ? Testing retrieval of a known rule
 
     return collection
 
 
-def load_vectorstore(persist_directory: str, collection_name="policy_rules"):
+def vectorstore_exists(persist_directory: str, backend: str = Config.POLICY_INDEX_BACKEND) -> bool:
+    if backend == "numpy":
+        return PolicyIndex.exists(persist_directory)
+    return os.path.exists(persist_directory) and bool(os.listdir(persist_directory))
+
+
+def load_vectorstore(persist_directory: str, collection_name="policy_rules", backend: str = Config.POLICY_INDEX_BACKEND):
+    """
+    Load the policy rules index: the in-memory PolicyIndex (memory-mapped .npy) with the "numpy" backend,
+    the Chroma collection with the "chroma" one. Both are queried the same way.
+    The keyword index saved in the same directory becomes the one used for retrieval.
+    """
+    load_keyword_index(persist_directory)
+    if backend == "numpy":
+        return PolicyIndex.load(persist_directory)
+
     client = chromadb.PersistentClient(path=persist_directory)
-    emb_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+    emb_fn = get_embedding_service().embedding_function
     coll = client.get_or_create_collection(name=collection_name, embedding_function=emb_fn)
     return coll
 
 
 def retrieve_policy_rules(clause: Clause, policy_coll: chromadb.api.models.Collection,
                           k: int = RETRIEVED_POLICIES_COUNT):
-    res = policy_coll.query(query_texts=[str(clause)], n_results=k)
-    rules = []
-    for i, doc in enumerate(res["documents"][0]):
-        meta = res["metadatas"][0][i]
-        rules.append({
-            "title": meta["title"],
-            "severity": meta["severity"],
-            "category": meta["category"],
-            "content": doc
-        })
-    return rules
+    return retrieve_policy_rules_batch([clause], policy_coll, k=k)[0]
 
 
-async def analyze_clause_llm(clause: Clause, rules: List[dict], rejected_clauses: List[dict], model="gpt-4.1-mini"):
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def retrieve_policy_rules_batch(clauses: List[Clause], policy_coll: chromadb.api.models.Collection,
+                                k: int = RETRIEVED_POLICIES_COUNT, query_embeddings: List | None = None,
+                                keyword_index: KeywordIndex | None = None) -> List[List[dict]]:
+    """
+    Top-k policy rules for each clause, with a single query for all of them.
+    Clauses are embedded by the collection unless their embeddings are given.
+    When a keyword index is available, rules whose detection hints occur in a clause are added to its
+    candidates and the candidates are re-ranked by similarity + keyword boost (see rerank_with_keyword_hits).
+    """
+    if not clauses:
+        return []
+    keyword_index = keyword_index or get_keyword_index()
+    batch_hits = [keyword_index.scan(str(clause)) for clause in clauses] if keyword_index else [{}] * len(clauses)
+    if query_embeddings is None and any(batch_hits):
+        query_embeddings = get_embedding_service().embed([str(clause) for clause in clauses])
 
-    policy_context = "\n\n".join(
-        [f"- {r['title']} (severity: {r['severity']}): {r['content']}" for r in rules]
-    )
+    if query_embeddings is not None:
+        res = policy_coll.query(query_embeddings=query_embeddings, n_results=k)
+    else:
+        res = policy_coll.query(query_texts=[str(clause) for clause in clauses], n_results=k)
+    if any(batch_hits):
+        return rerank_with_keyword_hits(res, batch_hits, query_embeddings, policy_coll, k)
+
+    batch_rules = []
+    for documents, metadatas in zip(res["documents"], res["metadatas"]):
+        rules = []
+        for doc, meta in zip(documents, metadatas):
+            rules.append(rule_entry(doc, meta))
+        batch_rules.append(rules)
+    return batch_rules
+
+
+def rule_entry(doc: str, meta: dict, hits: dict | None = None) -> dict:
+    hits = hits or {}
+    return {
+        "id": meta["id"],
+        "title": meta["title"],
+        "severity": meta["severity"],
+        "category": meta["category"],
+        "content": doc,
+        "keyword_hits": hits.get("keywords", []),
+        "anti_keyword_hits": hits.get("anti_keywords", []),
+    }
+
+
+def rerank_with_keyword_hits(res: dict, batch_hits: List[dict], query_embeddings: List,
+                             policy_coll: chromadb.api.models.Collection, k: int) -> List[List[dict]]:
+    """
+    Candidates of a clause are its top-k rules by embedding plus the rules with keyword hits in it.
+    They are scored by cosine similarity + KEYWORD_HIT_BOOST per distinct keyword found (capped), and the
+    k best are kept. Similarities are computed from the stored rule embeddings, fetched in one call.
+    """
+    candidate_ids = [list(dict.fromkeys([*ids, *hits])) for ids, hits in zip(res["ids"], batch_hits)]
+    fetched = policy_coll.get(ids=list(dict.fromkeys(i for ids in candidate_ids for i in ids)),
+                              include=["embeddings", "documents", "metadatas"])
+    positions = {rule_id: i for i, rule_id in enumerate(fetched["ids"])}
+    rule_embeddings = np.asarray(fetched["embeddings"], dtype=np.float32)
+    rule_embeddings /= np.clip(np.linalg.norm(rule_embeddings, axis=1, keepdims=True), 1e-12, None)
+
+    batch_rules = []
+    for query, ids, hits in zip(query_embeddings, candidate_ids, batch_hits):
+        query = np.asarray(query, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scored = []
+        for rule_id in ids:
+            if rule_id not in positions:
+                continue
+            rule_hits = hits.get(rule_id, {})
+            hit_count = sum(len(keywords) for keywords in rule_hits.values())
+            score = float(rule_embeddings[positions[rule_id]] @ query) \
+                + Config.KEYWORD_HIT_BOOST * min(hit_count, Config.KEYWORD_MAX_BOOSTED_HITS)
+            scored.append((score, rule_id))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        batch_rules.append([rule_entry(fetched["documents"][positions[rule_id]],
+                                       fetched["metadatas"][positions[rule_id]], hits.get(rule_id))
+                            for _, rule_id in scored[:k]])
+    return batch_rules
 
+
+def retrieve_context_batch(clauses: List[Clause], policy_coll: chromadb.api.models.Collection,
+                           rejections_coll: chromadb.api.models.Collection,
+                           k: int = RETRIEVED_POLICIES_COUNT,
+                           embedding_service: EmbeddingService | None = None,
+                           query_embeddings: List | None = None) -> List[Tuple[List[dict], dict]]:
+    """
+    (retrieved rules, similar rejections) for each clause. All clauses are embedded in one model call
+    (unless their embeddings are given) and the same vectors are used to query each collection once
+    for the whole batch.
+    """
+    if not clauses:
+        return []
+    embedding_service = embedding_service or get_embedding_service()
+    queries = [str(clause) for clause in clauses]
+    embeddings = query_embeddings if query_embeddings is not None else embedding_service.embed(queries)
+    batch_rules = retrieve_policy_rules_batch(clauses, policy_coll, k=k, query_embeddings=embeddings)
+    batch_rejections = search_similar_rejections_batch(rejections_coll, queries, n_results=3,
+                                                       query_embeddings=embeddings)
+    return list(zip(batch_rules, batch_rejections))
+
+
+def keyword_hits_context(rule: dict) -> str:
+    """Detection hints of the rule found in the clause, if any."""
+    context = ""
+    if rule.get("keyword_hits"):
+        context += f"\n  Keywords of this rule found in the clause: {', '.join(rule['keyword_hits'])}"
+    if rule.get("anti_keyword_hits"):
+        context += f"\n  Anti-keywords of this rule found in the clause: {', '.join(rule['anti_keyword_hits'])}"
+    return context
+
+
+def format_rejected_context(rejected_clauses: dict) -> str:
     rejected_clauses = [f"Previously rejected clause:\n{doc}\nReason: {meta.get('comment', '')}" for doc, meta in
                         zip(rejected_clauses['documents'][0],
                             rejected_clauses['metadatas'][0])] if rejected_clauses.get('documents') else []
-    rejected_context = "\n---\n".join(rejected_clauses)
+    return "\n---\n".join(rejected_clauses)
+
+
+def evaluation_schema(fields: List[str] = EVALUATION_FIELDS) -> dict:
+    """JSON schema of (some fields of) a clause evaluation, enums included, for structured outputs."""
+    properties = {
+        "best_rule": {"type": "string"},
+        "severity": {"type": "string", "enum": POLICY_SEVERITIES},
+        "status": {"type": "string", "enum": CLAUSE_STATUS},
+        "reason": {"type": "string"},
+    }
+    return {"type": "object", "properties": {field: properties[field] for field in fields},
+            "required": list(fields), "additionalProperties": False}
+
+
+def json_schema_format(name: str, schema: dict) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def parse_json_response(text: str) -> Any:
+    """
+    Decode a JSON answer, tolerating code fences and text around it. Returns None if there is no complete
+    JSON value, e.g. when the answer was cut off.
+    """
+    text = (text or "").replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    try:
+        return json.JSONDecoder().raw_decode(text[min(starts):])[0]
+    except ValueError:
+        return None
+
+
+def parse_evaluation(text: str) -> dict:
+    """
+    Fields of a clause evaluation found in an answer. When the answer is not valid JSON (truncated...),
+    the string fields that were completely written are still recovered.
+    """
+    value = parse_json_response(text)
+    if isinstance(value, dict):
+        return value
+    evaluation = {}
+    for field in EVALUATION_FIELDS:
+        match = re.search(rf'"{field}"\s*:\s*("(?:[^"\\]|\\.)*")', text or "")
+        if match:
+            evaluation[field] = json.loads(match.group(1))
+    return evaluation
+
+
+def normalize_evaluation(evaluation: dict) -> dict:
+    """Pick the evaluation fields, fixing the case of enum values ("High" -> "high")."""
+    evaluation = {field: evaluation.get(field) for field in EVALUATION_FIELDS if field in evaluation}
+    for field, allowed in (("severity", POLICY_SEVERITIES), ("status", CLAUSE_STATUS)):
+        if isinstance(evaluation.get(field), str):
+            evaluation[field] = next((value for value in allowed if value.lower() == evaluation[field].strip().lower()),
+                                     evaluation[field])
+    return evaluation
+
+
+def invalid_fields(evaluation: dict) -> List[str]:
+    checks = {
+        "best_rule": lambda value: isinstance(value, str) and bool(value.strip()),
+        "severity": lambda value: value in POLICY_SEVERITIES,
+        "status": lambda value: value in CLAUSE_STATUS,
+        "reason": lambda value: isinstance(value, str),
+    }
+    return [field for field, check in checks.items() if not check(evaluation.get(field))]
+
+
+def is_valid_evaluation(evaluation: Any) -> bool:
+    return isinstance(evaluation, dict) and not invalid_fields(evaluation)
+
+
+_parse_stats = {"responses": 0, "parse_failures": 0, "repairs": 0, "repair_failures": 0}
+_parse_stats_lock = threading.Lock()
+
+
+def record_parse_stat(name: str, count: int = 1):
+    with _parse_stats_lock:
+        _parse_stats[name] += count
+
+
+def parse_stats() -> dict:
+    """How often LLM answers could not be used as is, and how often the repair call fixed them."""
+    with _parse_stats_lock:
+        stats = dict(_parse_stats)
+    stats["parse_failure_rate"] = round(stats["parse_failures"] / stats["responses"], 3) if stats["responses"] else None
+    stats["repair_success_rate"] = round(1 - stats["repair_failures"] / stats["repairs"], 3) if stats["repairs"] else None
+    return stats
+
+
+async def repair_evaluation(clause: Clause, evaluation: dict, fields: List[str], model=EVALUATION_MODEL) -> dict:
+    """
+    Short follow-up call asking only for the fields of an evaluation that were missing or invalid,
+    instead of evaluating the clause again. Returns the repaired fields that are valid.
+    """
+    valid_part = {field: value for field, value in evaluation.items() if field not in fields}
+    prompt = f"""
+    An evaluation of the NDA clause below is missing or has invalid values for: {', '.join(fields)}.
+
+    Clause:
+    \"\"\"{str(clause)}\"\"\"
+
+    Valid part of the evaluation:
+    {json.dumps(valid_part)}
+
+    Allowed severities: {', '.join(POLICY_SEVERITIES)}. Allowed statuses: {', '.join(CLAUSE_STATUS)}.
+    Respond strictly in JSON with only these fields: {', '.join(fields)}.
+    """
+    record_parse_stat("repairs")
+    try:
+        text = await chat_completion_async(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            response_format=json_schema_format("clause_evaluation_repair", evaluation_schema(fields)),
+        )
+        repaired = normalize_evaluation(parse_evaluation(text))
+    except Exception as e:
+        print(f"⚠️ Evaluation repair failed: {e}")
+        repaired = {}
+    repaired = {field: value for field, value in repaired.items()
+                if field in fields and field not in invalid_fields(repaired)}
+    if len(repaired) < len(fields):
+        record_parse_stat("repair_failures")
+    return repaired
+
+
+async def analyze_clause_llm(clause: Clause, rules: List[dict], rejected_clauses: List[dict], model=EVALUATION_MODEL):
+    policy_context = "\n\n".join(
+        [f"- {r['title']} (severity: {r['severity']}): {r['content']}" + keyword_hits_context(r) for r in rules]
+    )
+
+    rejected_context = format_rejected_context(rejected_clauses)
 
     prompt = f"""
     You are an expert in contract law reviewing an NDA clause against internal compliance policies.
@@ -144,128 +426,642 @@ async def analyze_clause_llm(clause: Clause, rules: List[dict], rejected_clauses
     }}
     """
     try:
-        response = await client.chat.completions.create(
+        # Transient errors (rate limits...) are retried for this clause only
+        text = await chat_completion_async(
             model=model,
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.2
+            temperature=0.2,
+            response_format=json_schema_format("clause_evaluation", evaluation_schema()),
         )
+    except Exception as e:
+        return {"best_rule": "Parsing Error", "status": "Needs Review", "reason": str(e), "degraded": True}
+
+    result = normalize_evaluation(parse_evaluation(text))
+    record_parse_stat("responses")
+    invalid = invalid_fields(result)
+    if invalid:
+        # Only ask again for what is wrong, the valid fields are kept
+        record_parse_stat("parse_failures")
+        result.update(await repair_evaluation(clause, result, invalid, model))
+        invalid = invalid_fields(result)
+    if invalid:
+        print(f"⚠️ Invalid evaluation fields after repair: {invalid}")
+        defaults = {"best_rule": "Parsing Error", "severity": "medium", "status": "Needs Review",
+                    "reason": f"Invalid LLM answer: {text}"}
+        result.update({field: defaults[field] for field in invalid})
+        # Some fields are made up: the evaluation is shown for review but never cached
+        result["degraded"] = True
+
+    return result
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text), enough to size batches."""
+    return len(text) // 4 + 1
+
+
+def format_batch_clause(index: int, clause: Clause, rules: List[dict], rejected_clauses: dict) -> str:
+    """A clause of a batched prompt: its text, the ids of its relevant rules and its rejected look-alikes."""
+    rule_refs = "\n".join(f"  - [{r.get('id', r['title'])}]" + keyword_hits_context(r).replace("\n", "\n  ")
+                          for r in rules)
+    rejected_context = format_rejected_context(rejected_clauses)
+    return f"""
+    Clause {index}:
+    \"\"\"{str(clause)}\"\"\"
+    Most relevant policy rules:
+    {rule_refs}
+    Previously rejected similar clauses:
+    {rejected_context if rejected_context else 'None'}
+    """
+
+
+def plan_llm_batches(clause_tokens: List[int], max_tokens: int = Config.LLM_BATCH_MAX_PROMPT_TOKENS,
+                     max_clauses: int = Config.LLM_BATCH_MAX_CLAUSES) -> List[List[int]]:
+    """
+    Group clause indices, in order, into batches whose estimated prompt size stays within max_tokens.
+    A clause larger than the budget gets a batch of its own.
+    """
+    batches, current, current_tokens = [], [], 0
+    for i, tokens in enumerate(clause_tokens):
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_clauses):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def analyze_clauses_batch_llm(clauses: List[Clause], contexts: List[Tuple[List[dict], dict]],
+                                    model=EVALUATION_MODEL) -> List[dict | None]:
+    """
+    Evaluate several clauses in one request: the instructions and the policy rules they refer to are sent
+    once, then each clause with the ids of its retrieved rules. The answer is a JSON array with one entry per
+    clause. Entries that are missing or invalid come back as None, to be evaluated on their own.
+    """
+    rules_by_id = {}
+    for rules, _ in contexts:
+        for r in rules:
+            rules_by_id.setdefault(r.get("id", r["title"]), r)
+    policy_context = "\n\n".join(
+        [f"- [{rule_id}] {r['title']} (severity: {r['severity']}): {r['content']}" for rule_id, r in rules_by_id.items()]
+    )
+    clauses_context = "".join(format_batch_clause(i, clause, rules, rejections)
+                              for i, (clause, (rules, rejections)) in enumerate(zip(clauses, contexts)))
+
+    prompt = f"""
+    You are an expert in contract law reviewing NDA clauses against internal compliance policies.
+
+    Internal policy rules:
+    {policy_context}
+
+    Clauses to evaluate, each with the ids of its most relevant rules:
+    {clauses_context}
+
+    Task, for each clause independently:
+    - Determine which rule applies most directly.
+    - State whether the clause is compliant, non-compliant, or ambiguous.
+    - Justify your decision in one or two sentences, citing evidence from the clause.
 
-        text = response.choices[0].message.content.strip()
-        text = text.replace("```json", "").replace("```", "").strip()
+    Respond strictly in JSON, with an "evaluations" array containing one object per clause:
+    {{
+      "evaluations": [
+        {{
+          "clause_index": integer,
+          "best_rule": "string (rule title)",
+          "severity": "{'|'.join(POLICY_SEVERITIES)}",
+          "status": "{'|'.join(CLAUSE_STATUS)}",
+          "reason": "string explanation"
+        }}
+      ]
+    }}
+    """
+    item_schema = evaluation_schema()
+    item_schema["properties"] = {"clause_index": {"type": "integer"}, **item_schema["properties"]}
+    item_schema["required"] = ["clause_index", *item_schema["required"]]
+    batch_schema = {"type": "object", "properties": {"evaluations": {"type": "array", "items": item_schema}},
+                    "required": ["evaluations"], "additionalProperties": False}
 
-        result = json.loads(text)
+    evaluations: List[dict | None] = [None] * len(clauses)
+    try:
+        text = await chat_completion_async(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            response_format=json_schema_format("clause_evaluations", batch_schema),
+        )
+        items = parse_json_response(text)
     except Exception as e:
-        result = {"best_rule": "Parsing Error", "status": "Needs Review", "reason": str(e)}
+        print(f"⚠️ Batched evaluation of {len(clauses)} clauses failed, evaluating them one by one: {e}")
+        return evaluations
 
-    return result
+    record_parse_stat("responses")
+    if isinstance(items, dict):
+        items = items.get("evaluations")
+    if not isinstance(items, list):
+        record_parse_stat("parse_failures")
+        print(f"⚠️ Could not parse the batched evaluation of {len(clauses)} clauses, evaluating them one by one.")
+        return evaluations
 
+    for item in items:
+        index = item.get("clause_index") if isinstance(item, dict) else None
+        if isinstance(index, int) and 0 <= index < len(clauses) and evaluations[index] is None:
+            evaluation = normalize_evaluation(item)
+            if is_valid_evaluation(evaluation):
+                evaluations[index] = evaluation
+    return evaluations
 
-async def evaluate_clause(clause: Clause, policy_coll: chromadb.api.models.Collection,
-                          rejections_coll: chromadb.api.models.Collection,
-                          k: int = RETRIEVED_POLICIES_COUNT) -> dict:
-    retrieved_rules = retrieve_policy_rules(clause, policy_coll, k=k)
-    rejected_clauses = search_similar_rejections(rejections_coll, str(clause), n_results=3)
-    llm_eval = await analyze_clause_llm(clause, retrieved_rules, rejected_clauses)
+
+def plan_clause_batches(clauses: List[Clause], contexts: List[Tuple[List[dict], dict]]) -> List[List[int]]:
+    """Indices of clauses grouped into requests sized by LLM_BATCH_MAX_PROMPT_TOKENS."""
+    clause_tokens = [estimate_tokens(format_batch_clause(i, clause, rules, rejections))
+                     + sum(estimate_tokens(r["content"]) for r in rules)
+                     for i, (clause, (rules, rejections)) in enumerate(zip(clauses, contexts))]
+    return plan_llm_batches(clause_tokens)
+
+
+async def analyze_llm_batch(clauses: List[Clause], contexts: List[Tuple[List[dict], dict]],
+                            model=EVALUATION_MODEL) -> List[dict]:
+    """
+    LLM evaluations of a batch of clauses in one request. Clauses the batched answer missed (and batches
+    of one clause) fall back to a single-clause call.
+    """
+    evaluations, _ = await analyze_llm_batch_versioned(clauses, contexts, model)
+    return evaluations
+
+
+async def analyze_llm_batch_versioned(clauses: List[Clause], contexts: List[Tuple[List[dict], dict]],
+                                      model=EVALUATION_MODEL) -> Tuple[List[dict], List[str]]:
+    """analyze_llm_batch, with the version of the prompt each evaluation comes from (for its cache key)."""
+    evaluations: List[dict | None] = [None] * len(clauses)
+    if len(clauses) > 1:
+        evaluations = await analyze_clauses_batch_llm(clauses, contexts, model)
+    prompt_versions = [BATCH_PROMPT_VERSION if evaluation is not None else EVALUATION_PROMPT_VERSION
+                       for evaluation in evaluations]
+    missing = [i for i, evaluation in enumerate(evaluations) if evaluation is None]
+    single_evaluations = await asyncio.gather(*[
+        analyze_clause_llm(clauses[i], contexts[i][0], contexts[i][1], model) for i in missing])
+    for i, evaluation in zip(missing, single_evaluations):
+        evaluations[i] = evaluation
+    return evaluations, prompt_versions
+
+
+async def analyze_clauses_llm_batched(clauses: List[Clause], contexts: List[Tuple[List[dict], dict]],
+                                      model=EVALUATION_MODEL) -> List[dict]:
+    """LLM evaluations of clauses packed into batched requests, batches run concurrently."""
+    batches = plan_clause_batches(clauses, contexts)
+    batch_evaluations = await asyncio.gather(*[
+        analyze_llm_batch([clauses[i] for i in batch], [contexts[i] for i in batch], model) for batch in batches])
+    evaluations: List[dict | None] = [None] * len(clauses)
+    for batch, results in zip(batches, batch_evaluations):
+        for i, evaluation in zip(batch, results):
+            evaluations[i] = evaluation
+    return evaluations
+
+
+def clause_result(clause: Clause, retrieved_rules: List[dict], llm_eval: dict, cache_hit: bool,
+                  decided_by: str = "llm", confidence: float | None = None) -> dict:
+    """decided_by: "llm" or "classifier" (rule-decided fast path, with its confidence)."""
     return {
         "clause": {"title": clause.title, "body": clause.body, "pages": clause.pages},
         "retrieved_rules": retrieved_rules,
         "llm_evaluation": llm_eval,
+        "llm_cache_hit": cache_hit,
+        "decided_by": decided_by,
+        "confidence": confidence,
     }
 
 
+async def evaluate_clause(clause: Clause, policy_coll: chromadb.api.models.Collection,
+                          rejections_coll: chromadb.api.models.Collection,
+                          k: int = RETRIEVED_POLICIES_COUNT, retrieved_rules: List[dict] | None = None,
+                          rejected_clauses: dict | None = None, cached_evaluation: dict | None = None) -> dict:
+    """
+    Evaluate a clause, retrieving its context first unless it was already retrieved (batch retrieval).
+    The LLM is not called when a cached evaluation is given.
+    """
+    if retrieved_rules is None or rejected_clauses is None:
+        retrieved_rules, rejected_clauses = retrieve_context_batch([clause], policy_coll, rejections_coll, k=k)[0]
+    if cached_evaluation is not None:
+        llm_eval = cached_evaluation
+    else:
+        llm_eval = await analyze_clause_llm(clause, retrieved_rules, rejected_clauses)
+    return clause_result(clause, retrieved_rules, llm_eval, cached_evaluation is not None)
+
+
+def evaluation_cache_key(clause: Clause, retrieved_rules: List[dict], rejected_clauses: dict,
+                         rejections_set_version: str, prompt_version: str = EVALUATION_PROMPT_VERSION) -> str:
+    """prompt_version: EVALUATION_PROMPT_VERSION or BATCH_PROMPT_VERSION, the prompt the evaluation comes from."""
+    rejection_ids = rejected_clauses["ids"][0] if rejected_clauses.get("ids") else []
+    return EvaluationCache.key(str(clause), [rule.get("id", rule["title"]) for rule in retrieved_rules],
+                               rejection_ids, EVALUATION_MODEL, prompt_version, policy_version(),
+                               rejections_set_version)
+
+
 def extract_text_from_pdf(pdf_path: str) -> List[dict]:
     """
     Preprocess a PDF document to extract text.
+    Born-digital pages are read from their text layer, scanned pages are OCR'd.
     """
-    # Convert PDF to images
-    images = convert_from_path(pdf_path)
+    return extract_pages(pdf_path)
 
-    # Extract text from each image using OCR
-    pages = []
-    for page_number, image in enumerate(images):
-        text = image_to_string(image)
-        pages.append({
-            "page_number": page_number + 1,
-            "text": text.strip()
-        })
-    return pages
 
+def page_marker(page: dict) -> str:
+    return f"[[PAGE_{page['page_number']}]]"
 
-def combine_pages_with_markers(pages: List[dict]) -> str:
-    combined = ""
+
+class PageOffsetIndex:
+    """
+    Character offsets of the [[PAGE_n]] markers of a combined text, recorded once when the text is built.
+    Page spans and marker removal then only need a bisect instead of re-scanning the clause text.
+    """
+
+    def __init__(self):
+        self.offsets: List[int] = []
+        self.page_numbers: List[int] = []
+        self.lengths: List[int] = []
+
+    def add(self, offset: int, page_number: int, length: int):
+        self.offsets.append(offset)
+        self.page_numbers.append(page_number)
+        self.lengths.append(length)
+
+    def locate(self, offset: int) -> int:
+        """Index of the first marker starting at or after offset."""
+        return bisect_left(self.offsets, offset)
+
+    def drop_before(self, offset: int):
+        """Forget the markers before offset and shift the others, for when a text buffer is trimmed."""
+        k = self.locate(offset)
+        del self.offsets[:k], self.page_numbers[:k], self.lengths[:k]
+        self.offsets = [o - offset for o in self.offsets]
+
+    def text_without_markers(self, text: str, start: int, end: int, lo: int, hi: int) -> str:
+        """text[start:end] minus the markers lo..hi-1 (the ones located in that range)."""
+        parts = []
+        position = start
+        for i in range(lo, hi):
+            parts.append(text[position:self.offsets[i]])
+            position = self.offsets[i] + self.lengths[i]
+        parts.append(text[position:end])
+        return "".join(parts)
+
+
+def append_page(parts: List[str], length: int, page: dict, index: PageOffsetIndex) -> int:
+    """Append a page with its marker to a text being built, returns the new text length."""
+    marker = page_marker(page)
+    index.add(length, page["page_number"], len(marker))
+    parts.extend((marker, "\n", page["text"]))
+    return length + len(marker) + 1 + len(page["text"])
+
+
+def combine_pages_with_index(pages: List[dict]) -> Tuple[str, PageOffsetIndex]:
+    parts, length, index = [], 0, PageOffsetIndex()
     for page in pages:
-        combined += f"[[PAGE_{page['page_number']}]]\n" + page["text"]
-    return combined
+        length = append_page(parts, length, page, index)
+    return "".join(parts), index
 
 
-def segment_clauses(pages: List[dict]) -> List[Clause]:
-    """Segments text into clauses while correctly tracking page ranges."""
-    combined = combine_pages_with_markers(pages)
+def combine_pages_with_markers(pages: List[dict]) -> str:
+    return combine_pages_with_index(pages)[0]
+
+
+# Chunk by clauses titles
+# TODO: Optionally we could ask a LLM to PDF2MD and then use a simpler regex pattern to get titles
+# Note that this could be improved to ensure we capture clauses for different formats of NDA including sub-clauses
+CLAUSE_TITLE_PATTERN = re.compile(r'(?:\n|^)(\d{1,2}\.\s+[A-Z][^\n]+)(?=\n)')
+
+
+def build_clause(text: str, index: PageOffsetIndex, title_start: int, title_end: int, end: int,
+                 current_page_marker: int) -> Tuple[Clause, int]:
+    """
+    Build the clause whose title is text[title_start:title_end] and body text[title_end:end].
+    Returns it along with the updated current page.
+    """
+    lo, mid, hi = index.locate(title_start), index.locate(title_end), index.locate(end)
+
+    # Page markers within the clause
+    page_markers = index.page_numbers[lo:hi]
+
+    if page_markers:
+        first_marker = page_markers[0]
+        pages_for_clause = set(page_markers)
 
-    # Chunk by clauses titles
-    # TODO: Optionally we could ask a LLM to PDF2MD and then use a simpler regex pattern to get titles
-    # Note that this could be improved to ensure we capture clauses for different formats of NDA including sub-clauses
-    pattern = r'(?:\n|^)(\d{1,2}\.\s+[A-Z][^\n]+)(?=\n)'
-    sections = re.split(pattern, combined)
+        # Whether the marker is at the title start or inside title/body, the clause starts before it
+        # → clause spans previous and current pages
+        if first_marker > 1:
+            pages_for_clause.add(first_marker - 1)
+
+        current_page_marker = max(pages_for_clause)
+    else:
+        # No marker: clause stays on the same page
+        pages_for_clause = {current_page_marker}
+
+    clause = Clause(
+        title=index.text_without_markers(text, title_start, title_end, lo, mid).strip(),
+        body=index.text_without_markers(text, title_end, end, mid, hi).strip(),
+        pages=sorted(pages_for_clause)
+    )
+    return clause, current_page_marker
+
+
+def segment_clauses(pages: List[dict]) -> List[Clause]:
+    """Segments text into clauses while correctly tracking page ranges, in a single pass over the text."""
+    combined, index = combine_pages_with_index(pages)
+    titles = [match.span(1) for match in CLAUSE_TITLE_PATTERN.finditer(combined)]
 
     clauses = []
     current_page_marker = 1
 
-    for i in range(1, len(sections), 2):
-        title_raw = sections[i].strip()
-        body_raw = sections[i + 1].strip() if i + 1 < len(sections) else ""
+    for i, (title_start, title_end) in enumerate(titles):
+        # The body runs until the newline preceding the next title
+        end = titles[i + 1][0] - 1 if i + 1 < len(titles) else len(combined)
+        clause, current_page_marker = build_clause(combined, index, title_start, title_end, end,
+                                                   current_page_marker)
+        clauses.append(clause)
+
+    return clauses
 
-        # Collect all page markers
-        page_markers = [int(p) for p in re.findall(r'\[\[PAGE_(\d+)\]\]', title_raw + body_raw)]
 
-        if page_markers:
-            first_marker = page_markers[0]
-            pages_for_clause = set(page_markers)
+class IncrementalClauseSegmenter:
+    """
+    Segments pages into clauses as they arrive, yielding the same clauses as segment_clauses.
+    A clause is emitted as soon as the next clause title confirms where it ends, the last one on close().
+    """
 
-            if title_raw.startswith(f'[[PAGE_{first_marker}]]'):
-                # Clause starts before the first marker (marker at title start)
-                if first_marker > 1:
-                    pages_for_clause.add(first_marker - 1)
-            else:
-                # Marker inside title or body → clause spans previous and current pages
-                if first_marker > 1:
-                    pages_for_clause.add(first_marker - 1)
+    def __init__(self):
+        # Text from the start of the pending clause title (or of the preamble) onwards
+        self._buffer = ""
+        self._index = PageOffsetIndex()
+        # Span of the pending clause title in the buffer, None while no title has been seen
+        self._title_start = None
+        self._title_end = None
+        self._current_page_marker = 1
 
-            current_page_marker = max(pages_for_clause)
-        else:
-            # No marker: clause stays on the same page
-            pages_for_clause = {current_page_marker}
-
-        # Clean markers
-        clean_title = re.sub(r'\[\[PAGE_\d+\]\]', '', title_raw).strip()
-        clean_body = re.sub(r'\[\[PAGE_\d+\]\]', '', body_raw).strip()
-
-        clauses.append(
-            Clause(
-                title=clean_title,
-                body=clean_body,
-                pages=sorted(pages_for_clause)
-            )
-        )
+    def feed(self, page: dict) -> List[Clause]:
+        parts = [self._buffer]
+        append_page(parts, len(self._buffer), page, self._index)
+        self._buffer = "".join(parts)
 
-    return clauses
+        # Only the text after the pending title has to be scanned. A title is only matched once the
+        # newline ending it has arrived, so a match found here can't change with later pages.
+        matches = list(CLAUSE_TITLE_PATTERN.finditer(self._buffer, self._title_end or 0))
+        if not matches:
+            return []
+
+        clauses = []
+        for match in matches:
+            if self._title_end is not None:
+                clauses.append(self._emit(match.start()))
+            self._title_start, self._title_end = match.span(1)
+
+        # Drop everything before the new pending title
+        offset = self._title_start
+        self._buffer = self._buffer[offset:]
+        self._index.drop_before(offset)
+        self._title_start, self._title_end = 0, self._title_end - offset
+        return clauses
+
+    def close(self) -> List[Clause]:
+        if self._title_end is None:
+            return []
+        clause = self._emit(len(self._buffer))
+        self._buffer, self._index, self._title_start, self._title_end = "", PageOffsetIndex(), None, None
+        return [clause]
+
+    def _emit(self, end: int) -> Clause:
+        clause, self._current_page_marker = build_clause(self._buffer, self._index, self._title_start,
+                                                         self._title_end, end, self._current_page_marker)
+        return clause
 
 
 async def analyze_nda_async(pdf_path: str, policy_coll: chromadb.api.models.Collection,
-                            rejections_coll: chromadb.api.models.Collection) -> Tuple[Any]:
+                            rejections_coll: chromadb.api.models.Collection,
+                            progress: Callable[..., None] | None = None) -> Tuple[Any]:
+    progress = progress or (lambda **_: None)
+    progress(stage="extracting")
     text = extract_text_from_pdf(pdf_path)
     clauses = segment_clauses(text)
 
-    tasks = [evaluate_clause(clause, policy_coll, rejections_coll) for clause in clauses]
-    results = await asyncio.gather(*tasks)
+    progress(stage="evaluating", clauses_found=len(clauses), clauses_evaluated=0)
+    results = await evaluate_clauses(clauses, policy_coll, rejections_coll, get_embedding_service())
+    progress(clauses_evaluated=len(results))
     return results
 
 
+async def evaluate_clauses_iter(clauses: List[Clause], policy_coll: chromadb.api.models.Collection,
+                                rejections_coll: chromadb.api.models.Collection,
+                                embedding_service: EmbeddingService | None = None,
+                                k: int = RETRIEVED_POLICIES_COUNT) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    Retrieve the context of all clauses in one batch (off the event loop, embedding and Chroma calls are
+    blocking), then evaluate them. Clear-cut clauses are decided by the rule classifier (FAST_PATH) and
+    clauses found in the evaluation cache reuse their evaluation; the others go to the LLM concurrently.
+    Yields (index of the clause, result) as soon as each clause is evaluated, decided and cached ones first.
+    """
+    if not clauses:
+        return
+    embedding_service = embedding_service or get_embedding_service()
+    embeddings = await asyncio.to_thread(embedding_service.embed, [str(clause) for clause in clauses])
+    contexts = await asyncio.to_thread(retrieve_context_batch, clauses, policy_coll, rejections_coll, k,
+                                       embedding_service, embeddings)
+
+    evaluations, cache_hits, confidences = {}, set(), {}
+    classifier = get_rule_classifier()
+    if classifier is not None:
+        for i, (embedding, (rules, _)) in enumerate(zip(embeddings, contexts)):
+            decision = classifier.classify(embedding, rules)
+            if decision is not None:
+                evaluations[i], confidences[i] = decision
+
+    cache = get_evaluation_cache()
+    # (clause index, prompt version) -> cache key: evaluations of either prompt are reused, single-clause first
+    keys = {}
+    if cache is not None and len(evaluations) < len(clauses):
+        rejections_set_version = await asyncio.to_thread(rejections_version, rejections_coll)
+        keys = {(i, prompt_version): evaluation_cache_key(clauses[i], *contexts[i], rejections_set_version,
+                                                          prompt_version)
+                for i in range(len(clauses)) if i not in evaluations
+                for prompt_version in (EVALUATION_PROMPT_VERSION, BATCH_PROMPT_VERSION)}
+        cached = await asyncio.to_thread(cache.get_many, list(keys.values()))
+        for (i, _), key in keys.items():
+            if i not in evaluations and key in cached:
+                evaluations[i] = cached[key]
+                cache_hits.add(i)
+
+    def result(i: int) -> dict:
+        if i in confidences:
+            return clause_result(clauses[i], contexts[i][0], evaluations[i], False, "classifier", confidences[i])
+        return clause_result(clauses[i], contexts[i][0], evaluations[i], i in cache_hits)
+
+    for i in sorted(evaluations):
+        yield i, result(i)
+
+    pending = [i for i in range(len(clauses)) if i not in evaluations]
+    if Config.LLM_BATCH_MODE:
+        groups = [[pending[j] for j in batch]
+                  for batch in plan_clause_batches([clauses[i] for i in pending], [contexts[i] for i in pending])]
+    else:
+        groups = [[i] for i in pending]
+
+    prompt_versions = {}
+
+    async def evaluate_group(group: List[int]) -> Tuple[List[int], List[dict]]:
+        if len(group) == 1:
+            group_evaluations = [await analyze_clause_llm(clauses[group[0]], *contexts[group[0]])]
+            group_versions = [EVALUATION_PROMPT_VERSION]
+        else:
+            group_evaluations, group_versions = await analyze_llm_batch_versioned(
+                [clauses[i] for i in group], [contexts[i] for i in group])
+        prompt_versions.update(zip(group, group_versions))
+        return group, group_evaluations
+
+    tasks = [asyncio.create_task(evaluate_group(group)) for group in groups]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            group, group_evaluations = await next_done
+            evaluations.update(zip(group, group_evaluations))
+            for i in group:
+                yield i, result(i)
+    finally:
+        # The consumer went away (or a task failed): don't leave LLM calls running
+        for task in tasks:
+            task.cancel()
+
+    if cache is not None:
+        # Failed evaluations are not cached
+        await asyncio.to_thread(cache.put_many, {keys[i, prompt_versions[i]]: evaluations[i] for i in pending
+                                                 if not evaluations[i].get("degraded")},
+                                EVALUATION_MODEL)
+
+
+async def evaluate_clauses(clauses: List[Clause], policy_coll: chromadb.api.models.Collection,
+                           rejections_coll: chromadb.api.models.Collection,
+                           embedding_service: EmbeddingService | None = None,
+                           k: int = RETRIEVED_POLICIES_COUNT) -> List[dict]:
+    """Results of evaluate_clauses_iter, in the order of the clauses."""
+    results: List[dict | None] = [None] * len(clauses)
+    async for i, result in evaluate_clauses_iter(clauses, policy_coll, rejections_coll, embedding_service, k):
+        results[i] = result
+    return results
+
+
+async def iter_nda_results(pdf_path: str, policy_coll: chromadb.api.models.Collection,
+                           rejections_coll: chromadb.api.models.Collection,
+                           progress: Callable[..., None] | None = None) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    Yields (position of the clause in the document, result) as soon as each clause is evaluated.
+    Stages overlap: pages are extracted in a background thread and each clause is sent to retrieval and
+    the LLM as soon as the segmenter confirms it. Clauses confirmed by the same page share a retrieval batch.
+    """
+    progress = progress or (lambda **_: None)
+    counts = {"pages_extracted": 0, "clauses_found": 0, "clauses_evaluated": 0}
+    progress(stage="extracting", **counts)
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue()
+    # (position, result) of evaluated clauses, None once everything was evaluated
+    results = asyncio.Queue()
+    # Set when the consumer goes away: the extraction thread stops at the next page
+    stop = threading.Event()
+
+    def produce_pages():
+        pdf_pages = iter_pdf_pages(pdf_path)
+        try:
+            for page in pdf_pages:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(pages.put_nowait, page)
+        finally:
+            # Cancels the OCR pages still queued when stopped
+            pdf_pages.close()
+            loop.call_soon_threadsafe(pages.put_nowait, None)
+
+    segmenter = IncrementalClauseSegmenter()
+    embedding_service = get_embedding_service()
+    tasks = []
+
+    async def evaluate(clauses: List[Clause], offset: int):
+        async for i, result in evaluate_clauses_iter(clauses, policy_coll, rejections_coll, embedding_service):
+            counts["clauses_evaluated"] += 1
+            results.put_nowait((offset + i, result))
+
+    def schedule(clauses: List[Clause]):
+        if clauses:
+            tasks.append(asyncio.create_task(evaluate(clauses, counts["clauses_found"])))
+            counts["clauses_found"] += len(clauses)
+
+    async def segment():
+        try:
+            producer = loop.run_in_executor(None, produce_pages)
+            while (page := await pages.get()) is not None:
+                counts["pages_extracted"] += 1
+                schedule(segmenter.feed(page))
+                progress(**counts)
+            # Raises if extraction failed
+            await producer
+            schedule(segmenter.close())
+            progress(stage="evaluating", **counts)
+            await asyncio.gather(*tasks)
+        finally:
+            results.put_nowait(None)
+
+    segmenting = asyncio.create_task(segment())
+    try:
+        while (item := await results.get()) is not None:
+            progress(**counts)
+            yield item
+        # Raises if extraction or an evaluation failed
+        await segmenting
+    finally:
+        stop.set()
+        for task in [segmenting, *tasks]:
+            task.cancel()
+
+
+async def analyze_nda_streaming_async(pdf_path: str, policy_coll: chromadb.api.models.Collection,
+                                      rejections_coll: chromadb.api.models.Collection,
+                                      progress: Callable[..., None] | None = None) -> Tuple[Any]:
+    """Same results as analyze_nda_async, with the stages overlapping (see iter_nda_results)."""
+    results = {}
+    async for position, result in iter_nda_results(pdf_path, policy_coll, rejections_coll, progress):
+        results[position] = result
+    return [results[position] for position in sorted(results)]
+
+
 def analyze_nda(pdf_path: str, policy_coll: chromadb.api.models.Collection,
-                rejections_coll: chromadb.api.models.Collection) -> Tuple[Any]:
-    """Sync wrapper for Flask."""
+                rejections_coll: chromadb.api.models.Collection,
+                progress: Callable[..., None] | None = None) -> Tuple[Any]:
+    """
+    Sync wrapper for Flask. progress, if given, is called with keyword arguments: stage ("extracting",
+    "evaluating") when it changes, and pages_extracted / clauses_found / clauses_evaluated counts.
+    """
     print("Analyzing clauses...")
-    return asyncio.run(analyze_nda_async(pdf_path, policy_coll, rejections_coll))
+    if Config.STREAMING_ANALYSIS:
+        return asyncio.run(analyze_nda_streaming_async(pdf_path, policy_coll, rejections_coll, progress))
+    return asyncio.run(analyze_nda_async(pdf_path, policy_coll, rejections_coll, progress))
+
+
+def stream_nda_results(pdf_path: str, policy_coll: chromadb.api.models.Collection,
+                       rejections_coll: chromadb.api.models.Collection) -> Iterator[Tuple[int, dict]]:
+    """
+    Sync counterpart of iter_nda_results for Flask streaming responses: the event loop runs in the calling
+    thread between two results. Closing the generator cancels the evaluations still running.
+    """
+    print("Analyzing clauses (streaming results)...")
+    loop = asyncio.new_event_loop()
+    results = iter_nda_results(pdf_path, policy_coll, rejections_coll)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
 
 
 if __name__ == "__main__":
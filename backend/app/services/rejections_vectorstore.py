@@ -1,9 +1,10 @@
 import os
+from typing import List
 from chromadb import PersistentClient
 import chromadb.api.models.Collection as Collection
-from chromadb.utils import embedding_functions
 from app.config import Config
-from app.services.storage import download_from_gcs, upload_to_gcs, get_gcs_client
+from app.services.embeddings import get_embedding_service
+from app.services.storage import GCSStorage
 
 REJ_COLLECTION_NAME = "rejected_clauses"
 
@@ -19,22 +20,12 @@ def load_rejections_vectorstore():
     if GCS_BUCKET:
         try:
             print(f"Syncing rejections vectorstore from GCS bucket {GCS_BUCKET}...")
-            vector_blob_prefix = "materials/rejections_vectorstore/"
-            gcs_client = get_gcs_client()
-            blobs = gcs_client.list_blobs(GCS_BUCKET, prefix=vector_blob_prefix)
-            for blob in blobs:
-                relative_path = blob.name.replace(vector_blob_prefix, "")
-                if relative_path:
-                    dest_path = os.path.join(REJECTIONS_DIR, relative_path)
-                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                    blob.download_to_filename(dest_path)
+            GCSStorage(GCS_BUCKET).download_dir("materials/rejections_vectorstore/", REJECTIONS_DIR)
         except Exception as e:
             print(f"Warning could not sync vectorstore from GCS: {e}")
 
-    # Embedding function using SentenceTransformer model
-    embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    # Embedding function using SentenceTransformer model, shared with the policy vectorstore
+    embedding_fn = get_embedding_service().embedding_function
 
     coll = client.get_or_create_collection(name=REJ_COLLECTION_NAME, embedding_function=embedding_fn)
     return coll
@@ -52,13 +43,16 @@ def persist_rejections_vectorstore():
     if GCS_BUCKET:
         print(f"Uploading rejection vectorstore to gs://{GCS_BUCKET}/rejections_vectorstore/ ...")
         try:
-            for root, _, files in os.walk(REJECTIONS_DIR):
-                for file in files:
+            files = []
+            for root, _, names in os.walk(REJECTIONS_DIR):
+                for file in names:
                     local_file_path = os.path.join(root, file)
                     # Compute relative path to preserve folder structure
                     rel_path = os.path.relpath(local_file_path, REJECTIONS_DIR)
-                    blob_name = f"materials/rejections_vectorstore/{rel_path}"
-                    upload_to_gcs(GCS_BUCKET, local_file_path, blob_name)
+                    files.append((local_file_path, f"materials/rejections_vectorstore/{rel_path}"))
+            urls = GCSStorage(GCS_BUCKET).upload_many(files)
+            if None in urls:
+                raise RuntimeError(f"{urls.count(None)} of {len(files)} files not uploaded")
             print("Vectorstore upload complete.")
         except Exception as e:
             print(f"Could not upload vectorstore to GCS: {e}")
@@ -85,3 +79,22 @@ def add_rejection_to_vectorstore(rejection_id: int, clause_id: int, clause_text:
 def search_similar_rejections(coll: Collection, query: str, n_results: int = 3):
     """Retrieve most similar rejected clauses for context injection."""
     return coll.query(query_texts=[query], n_results=n_results)
+
+
+def search_similar_rejections_batch(coll: Collection, queries: List[str], n_results: int = 3,
+                                    query_embeddings: List | None = None) -> List[dict]:
+    """
+    Same as search_similar_rejections for several queries at once: a single query (and embedding pass)
+    for the whole batch, split back into one single-query result per input.
+    Pass query_embeddings to reuse vectors already computed for the queries.
+    """
+    if not queries:
+        return []
+    if query_embeddings is not None:
+        res = coll.query(query_embeddings=query_embeddings, n_results=n_results)
+    else:
+        res = coll.query(query_texts=queries, n_results=n_results)
+    return [
+        {key: value if key == "included" or value is None else [value[i]] for key, value in res.items()}
+        for i in range(len(queries))
+    ]
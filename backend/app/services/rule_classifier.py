@@ -0,0 +1,127 @@
+import os
+import json
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import Config
+from app.services.embeddings import EmbeddingService, get_embedding_service
+from app.services.evaluation_cache import policy_version
+
+
+@dataclass
+class FastPathThresholds:
+    """
+    Cosine similarities from which a clause is decided without the LLM:
+    - compliant: to a compliant example of the rule, with no anti-keyword of the rule in the clause,
+    - non_compliant: to a non-compliant example of the rule,
+    - anti_keyword: to a non-compliant example, when an anti-keyword of the rule is in the clause,
+    and in every case with at least margin over the best example of the other kind.
+    """
+    compliant: float = Config.FAST_PATH_COMPLIANT_SIMILARITY
+    non_compliant: float = Config.FAST_PATH_NON_COMPLIANT_SIMILARITY
+    anti_keyword: float = Config.FAST_PATH_ANTI_KEYWORD_SIMILARITY
+    margin: float = Config.FAST_PATH_MARGIN
+
+
+class RuleClassifier:
+    """
+    Deterministic pre-classifier deciding clear-cut clauses from the examples of the policy rules.
+    A clause is only decided against one of its retrieved rules whose keywords it contains, when it is
+    very close to the rule's compliant example (OK) or to its non-compliant one (Red Flag).
+    Anything less clear returns None and goes to the LLM.
+    """
+
+    def __init__(self, rules: List[dict], embedding_service: EmbeddingService):
+        self.rules = {rule["id"]: rule for rule in rules}
+        texts, self.example_rule_ids, self.example_labels = [], [], []
+        for rule in rules:
+            for label in ("compliant", "non_compliant"):
+                example = (rule.get("examples") or {}).get(label)
+                if example:
+                    texts.append(example)
+                    self.example_rule_ids.append(rule["id"])
+                    self.example_labels.append(label)
+        matrix = np.array(embedding_service.embed(texts), dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.example_embeddings = matrix / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def from_file(cls, rules_path: str, embedding_service: EmbeddingService) -> "RuleClassifier":
+        with open(rules_path, "r") as f:
+            return cls(json.load(f), embedding_service)
+
+    def example_similarities(self, clause_embedding) -> Dict[str, Tuple[float, float]]:
+        """Rule id -> (best similarity to its compliant examples, best to its non-compliant ones)."""
+        query = np.asarray(clause_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        similarities = {}
+        for rule_id, label, similarity in zip(self.example_rule_ids, self.example_labels,
+                                              self.example_embeddings @ query):
+            compliant, non_compliant = similarities.get(rule_id, (-1.0, -1.0))
+            if label == "compliant":
+                compliant = max(compliant, float(similarity))
+            else:
+                non_compliant = max(non_compliant, float(similarity))
+            similarities[rule_id] = (compliant, non_compliant)
+        return similarities
+
+    def classify(self, clause_embedding, retrieved_rules: List[dict],
+                 thresholds: Optional[FastPathThresholds] = None) -> Optional[Tuple[dict, float]]:
+        """(llm_evaluation-shaped decision, confidence), or None when not confident."""
+        return self.decide(self.example_similarities(clause_embedding), retrieved_rules, thresholds)
+
+    def decide(self, similarities: Dict[str, Tuple[float, float]], retrieved_rules: List[dict],
+               thresholds: Optional[FastPathThresholds] = None) -> Optional[Tuple[dict, float]]:
+        thresholds = thresholds or FastPathThresholds()
+        best = None
+        for retrieved in retrieved_rules:
+            rule = self.rules.get(retrieved.get("id"))
+            if rule is None or not (retrieved.get("keyword_hits") or retrieved.get("anti_keyword_hits")):
+                continue
+            compliant, non_compliant = similarities.get(rule["id"], (-1.0, -1.0))
+            red_flag_threshold = thresholds.anti_keyword if retrieved.get("anti_keyword_hits") \
+                else thresholds.non_compliant
+            if non_compliant >= red_flag_threshold and non_compliant - compliant >= thresholds.margin:
+                decision = ("Red Flag", non_compliant, "non-compliant")
+            elif (compliant >= thresholds.compliant and compliant - non_compliant >= thresholds.margin
+                  and not retrieved.get("anti_keyword_hits")):
+                decision = ("OK", compliant, "compliant")
+            else:
+                continue
+            if best is None or decision[1] > best[1][1]:
+                best = (rule, decision)
+
+        if best is None:
+            return None
+        rule, (status, similarity, label) = best
+        return {
+            "best_rule": rule["title"],
+            "severity": rule.get("severity", "medium"),
+            "status": status,
+            "reason": f"Rule-decided: the clause matches the {label} example of this rule "
+                      f"(similarity {similarity:.2f}): \"{rule['examples'][label.replace('-', '_')]}\"",
+        }, round(similarity, 3)
+
+
+_rule_classifier = None
+_rule_classifier_version = None
+_rule_classifier_lock = threading.Lock()
+
+
+def get_rule_classifier() -> Optional[RuleClassifier]:
+    """
+    Process-wide classifier built from POLICY_RULES_PATH, built again when the rules change (see policy_version).
+    None when the fast path is disabled.
+    """
+    global _rule_classifier, _rule_classifier_version
+    if not Config.FAST_PATH or not os.path.exists(Config.POLICY_RULES_PATH):
+        return None
+    with _rule_classifier_lock:
+        version = policy_version(Config.POLICY_RULES_PATH)
+        if _rule_classifier is None or version != _rule_classifier_version:
+            _rule_classifier = RuleClassifier.from_file(Config.POLICY_RULES_PATH, get_embedding_service())
+            _rule_classifier_version = version
+    return _rule_classifier
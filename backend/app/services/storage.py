@@ -1,56 +1,192 @@
 import os
+import time
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
 from google.cloud import storage
+from app.config import Config
+
+_gcs_client = None
+_gcs_client_pid = None
+_gcs_client_lock = threading.Lock()
 
 
 def get_gcs_client():
-    creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-    if creds_path:
-        # Local behavior
-        return storage.Client.from_service_account_json(creds_path)
-    else:
-        # On Cloud Run
-        return storage.Client()
+    """One client per process: it holds a pool of HTTP connections, thread-safe, not fork-safe."""
+    global _gcs_client, _gcs_client_pid
+    with _gcs_client_lock:
+        if _gcs_client is None or _gcs_client_pid != os.getpid():
+            creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+            if creds_path:
+                # Local behavior
+                _gcs_client = storage.Client.from_service_account_json(creds_path)
+            else:
+                # On Cloud Run
+                _gcs_client = storage.Client()
+            _gcs_client_pid = os.getpid()
+    return _gcs_client
+
+
+class Storage(ABC):
+    """Object storage of the uploaded PDFs, reports and materials. Names are "/"-separated paths."""
+
+    name = "storage"
+
+    @abstractmethod
+    def upload(self, local_path: str, name: str, make_public: bool = True) -> str:
+        """Stores the file under name, returns its URL."""
+
+    @abstractmethod
+    def download(self, name: str, local_path: str) -> str:
+        ...
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[str]:
+        """Names of the stored files starting with prefix."""
+
+    def upload_many(self, files: List[Tuple[str, str]], make_public: bool = True,
+                    cleanup: bool = False) -> List[Optional[str]]:
+        """
+        Uploads the (local path, name) files at once on the storage threads. Returns their URLs, None for the
+        failed ones. With cleanup, each local file is deleted as soon as its upload succeeded.
+        """
+        def upload(local_path: str, name: str) -> Optional[str]:
+            try:
+                url = self.upload(local_path, name, make_public)
+            except Exception as e:
+                print(f"⚠️ Upload of {local_path} to {self.name} failed: {e}")
+                return None
+            if cleanup:
+                os.remove(local_path)
+            return url
+
+        futures = [get_storage_executor().submit(upload, local_path, name) for local_path, name in files]
+        return [future.result() for future in futures]
+
+    def download_dir(self, prefix: str, local_dir: str) -> int:
+        """Downloads the files under prefix to local_dir at once, keeping their relative paths. Returns their count."""
+        def download(name: str):
+            dest_path = os.path.join(local_dir, name[len(prefix):])
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            self.download(name, dest_path)
+
+        names = [name for name in self.list(prefix) if name[len(prefix):]]
+        for future in [get_storage_executor().submit(download, name) for name in names]:
+            future.result()
+        return len(names)
+
+
+class GCSStorage(Storage):
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self.name = f"gs://{bucket_name}"
+        self.bucket = get_gcs_client().bucket(bucket_name)
+
+    def upload(self, local_path: str, name: str, make_public: bool = True) -> str:
+        blob = self.bucket.blob(name)
+        blob.upload_from_filename(local_path)
+        if make_public:
+            blob.make_public()
+        return blob.public_url
+
+    def download(self, name: str, local_path: str) -> str:
+        self.bucket.blob(name).download_to_filename(local_path)
+        return local_path
+
+    def list(self, prefix: str) -> List[str]:
+        return [blob.name for blob in get_gcs_client().list_blobs(self.bucket_name, prefix=prefix)]
+
+
+class LocalStorage(Storage):
+    """
+    Storage in a local directory, for running and benchmarking the upload path offline.
+    latency (seconds) is added to every transfer, like a round trip to a remote storage.
+    """
+
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root = os.path.abspath(root)
+        self.name = self.root
+        self.latency = latency
+
+    def _path(self, name: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage name: {name}")
+        return path
+
+    def upload(self, local_path: str, name: str, make_public: bool = True) -> str:
+        time.sleep(self.latency)
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(local_path, path)
+        return path
+
+    def download(self, name: str, local_path: str) -> str:
+        time.sleep(self.latency)
+        shutil.copyfile(self._path(name), local_path)
+        return local_path
+
+    def list(self, prefix: str) -> List[str]:
+        names = []
+        for root, _, files in os.walk(self.root):
+            for file in files:
+                name = os.path.relpath(os.path.join(root, file), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    names.append(name)
+        return sorted(names)
+
+
+_storage_executor = None
+_storage_executor_lock = threading.Lock()
+
+
+def get_storage_executor() -> ThreadPoolExecutor:
+    global _storage_executor
+    with _storage_executor_lock:
+        if _storage_executor is None:
+            _storage_executor = ThreadPoolExecutor(max_workers=Config.STORAGE_WORKERS, thread_name_prefix="storage")
+    return _storage_executor
+
+
+def get_storage(bucket_name: str | None = None) -> Optional[Storage]:
+    """
+    Storage of the uploaded PDFs and reports: STORAGE_BACKEND "local" stores them in STORAGE_LOCAL_DIR,
+    "gcs" (or "" with a bucket) in the bucket. None when there is no storage (files stay where they are).
+    """
+    backend = Config.STORAGE_BACKEND or ("gcs" if bucket_name else "")
+    if backend == "local":
+        return LocalStorage(Config.STORAGE_LOCAL_DIR)
+    if backend == "gcs":
+        if not bucket_name:
+            raise ValueError("STORAGE_BACKEND=gcs requires GCS_BUCKET")
+        return GCSStorage(bucket_name)
+    if backend:
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return None
 
 
 def ensure_materials_available(bucket_name: str, local_rules_path: str, local_vector_dir: str):
-    client = get_gcs_client()
-    bucket = client.bucket(bucket_name)
+    gcs = GCSStorage(bucket_name)
 
     # Download policyRules.json
     if not os.path.exists(local_rules_path):
         os.makedirs(os.path.dirname(local_rules_path), exist_ok=True)
-
-        blob = bucket.blob("materials/policyRules.json")
-        blob.download_to_filename(local_rules_path)
+        gcs.download("materials/policyRules.json", local_rules_path)
         print("\tDownloaded policyRules.json from GCS.")
 
     # Download vectorstore directory
     if not os.path.exists(local_vector_dir) or not os.listdir(local_vector_dir):
         os.makedirs(local_vector_dir, exist_ok=True)
-        vector_blob_prefix = "materials/policy_vectorstore/"
-        blobs = client.list_blobs(bucket_name, prefix=vector_blob_prefix)
-        for blob in blobs:
-            relative_path = blob.name.replace(vector_blob_prefix, "")
-            if relative_path:
-                dest_path = os.path.join(local_vector_dir, relative_path)
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                blob.download_to_filename(dest_path)
-
+        gcs.download_dir("materials/policy_vectorstore/", local_vector_dir)
         print("\tDownloaded vectorstore from GCS.")
 
 
-def upload_to_gcs(bucket_name: str, local_path: str, blob_name: str):
-    client = get_gcs_client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    blob.upload_from_filename(local_path)
-    blob.make_public()
-    return blob.public_url
+def upload_to_gcs(bucket_name: str, local_path: str, blob_name: str, make_public: bool = True):
+    return GCSStorage(bucket_name).upload(local_path, blob_name, make_public)
 
 
 def download_from_gcs(bucket_name: str, blob_name: str, local_path: str):
-    client = get_gcs_client()
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    blob.download_to_filename(local_path)
-    return local_path
+    return GCSStorage(bucket_name).download(blob_name, local_path)
@@ -0,0 +1,52 @@
+import os
+import hashlib
+import zipfile
+import tempfile
+from typing import BinaryIO, List, Tuple
+
+from werkzeug.utils import secure_filename
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def save_upload(stream: BinaryIO, folder: str, filename: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[str, str]:
+    """
+    Copies an uploaded file to a new file of folder (never overwriting another upload), hashing it
+    in the same pass. Returns (path, sha256 hex digest).
+    """
+    stem, extension = os.path.splitext(secure_filename(filename) or "upload")
+    fd, path = tempfile.mkstemp(dir=folder, prefix=f"{stem}_", suffix=extension)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := stream.read(chunk_size):
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def save_zip_pdfs(stream: BinaryIO, folder: str, max_files: int) -> List[Tuple[str, str, str]]:
+    """
+    Saves the PDF members of a ZIP archive like save_upload. Returns (path, member file name, sha256) of each.
+    Raises ValueError if the archive holds more than max_files PDFs (nothing is left on disk).
+    """
+    saved = []
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or info.filename.startswith("__MACOSX/") or not name.lower().endswith(".pdf"):
+                    continue
+                if len(saved) == max_files:
+                    raise ValueError(f"More than {max_files} PDFs in the archive")
+                with archive.open(info) as member:
+                    path, sha256 = save_upload(member, folder, name)
+                saved.append((path, name, sha256))
+    except BaseException:
+        for path, _, _ in saved:
+            os.remove(path)
+        raise
+    return saved
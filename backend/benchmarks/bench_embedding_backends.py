@@ -0,0 +1,63 @@
+# Run using 'PYTHONPATH=backend python backend/benchmarks/bench_embedding_backends.py' in NDAI project root
+# Needs both backends: torch + sentence-transformers, and the ONNX export ('python -m app.services.embedding_backends')
+import sys
+import json
+import time
+
+import numpy as np
+
+from app.config import Config
+from app.services.embedding_backends import create_encoder
+
+# Quantization should barely move the vectors: below this, retrieval results are likely to change
+MIN_COSINE_SIMILARITY = 0.98
+
+
+def policy_texts(path: str) -> list:
+    """Rule texts and clause examples of the policy, i.e. what ends up being embedded in production."""
+    with open(path, "r") as f:
+        rules = json.load(f)
+    texts = []
+    for rule in rules:
+        texts.append(f"{rule['title']}. {rule['compliance']} {rule['preferred']}")
+        texts.extend(rule.get("red_flags", []))
+        texts.extend(example for example in rule.get("examples", {}).values() if example)
+    return texts
+
+
+def throughput(encoder, texts: list, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        encoder(texts)
+        best = min(best, time.perf_counter() - t0)
+    return len(texts) / best
+
+
+if __name__ == "__main__":
+    texts = policy_texts(sys.argv[1] if len(sys.argv) > 1 else "backend/policyRules.json")
+    torch_encoder = create_encoder(Config.EMBEDDING_MODEL, "torch")
+    onnx_encoder = create_encoder(Config.EMBEDDING_MODEL, "onnx")
+
+    torch_vectors = np.asarray(torch_encoder(texts), dtype=np.float32)
+    onnx_vectors = np.asarray(onnx_encoder(texts), dtype=np.float32)
+    torch_vectors /= np.linalg.norm(torch_vectors, axis=1, keepdims=True)
+    onnx_vectors /= np.linalg.norm(onnx_vectors, axis=1, keepdims=True)
+
+    # Parity: cosine similarity between the two embeddings of each text, and nearest neighbours agreement
+    cosines = (torch_vectors * onnx_vectors).sum(axis=1)
+    torch_neighbours = (torch_vectors @ torch_vectors.T).argsort(axis=1)[:, -2]
+    onnx_neighbours = (onnx_vectors @ onnx_vectors.T).argsort(axis=1)[:, -2]
+    print(f"{len(texts)} texts")
+    print(f"cosine(torch, onnx): mean {cosines.mean():.4f}, min {cosines.min():.4f}")
+    print(f"same nearest neighbour: {(torch_neighbours == onnx_neighbours).mean():.1%}")
+
+    print(f"{'backend':>8} {'texts/s':>9}")
+    for name, encoder in (("torch", torch_encoder), ("onnx", onnx_encoder)):
+        throughput(encoder, texts[:8], repeat=1)  # warm up
+        print(f"{name:>8} {throughput(encoder, texts):>9.1f}")
+
+    if cosines.min() < MIN_COSINE_SIMILARITY:
+        print(f"❌ Parity check failed: min cosine similarity {cosines.min():.4f} < {MIN_COSINE_SIMILARITY}")
+        sys.exit(1)
+    print("✅ Parity check passed")
@@ -0,0 +1,42 @@
+# Run using 'PYTHONPATH=backend python backend/benchmarks/bench_llm_batching.py' in NDAI project root
+# Counts the LLM requests and prompt tokens (estimated) of single-clause vs batched evaluation of the example
+# NDAs. No request is sent: the LLM provider is an instant fake recording the prompts.
+import sys
+import glob
+import asyncio
+import tempfile
+
+from app.config import Config
+from app.services.llm_providers import FakeProvider, fake_answer, set_llm_provider
+from app.services.policy_matcher import (create_vectorstore, load_vectorstore, extract_text_from_pdf,
+                                         segment_clauses, evaluate_clauses, estimate_tokens)
+from app.services.rejections_vectorstore import load_rejections_vectorstore
+
+prompts = []
+
+
+def recording_answer(request: dict) -> str:
+    prompts.append(request["messages"][0]["content"])
+    return fake_answer(request)
+
+
+if __name__ == "__main__":
+    pdf_paths = sys.argv[1:] or sorted(glob.glob("examples/*.pdf"))
+    set_llm_provider(FakeProvider(latency=0, tokens_per_second=0, responder=recording_answer))
+    Config.EVALUATION_CACHE = ""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        create_vectorstore(Config.POLICY_RULES_PATH, persist_dir=tmp)
+        policy_coll = load_vectorstore(tmp)
+        rejections_coll = load_rejections_vectorstore()
+
+        print(f"{'document':>20} {'clauses':>8} {'mode':>8} {'requests':>9} {'prompt tokens':>14}")
+        for pdf_path in pdf_paths:
+            clauses = segment_clauses(extract_text_from_pdf(pdf_path))
+            for batch_mode in (False, True):
+                Config.LLM_BATCH_MODE = batch_mode
+                prompts.clear()
+                asyncio.run(evaluate_clauses(clauses, policy_coll, rejections_coll))
+                tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+                print(f"{pdf_path.split('/')[-1][:20]:>20} {len(clauses):>8} {'batched' if batch_mode else 'single':>8} "
+                      f"{len(prompts):>9} {tokens:>14}")
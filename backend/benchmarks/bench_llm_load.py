@@ -0,0 +1,55 @@
+# Run using 'PYTHONPATH=backend python backend/benchmarks/bench_llm_load.py [pdfs...]' in NDAI project root
+# Clause evaluation throughput of the example NDAs against a fake LLM, for a grid of latencies, error rates and
+# concurrency limits: measures the pipeline (retrieval, concurrency limit, retries, parsing) without spending
+# anything. Set LLM_RECORD_MODE=replay to measure against recorded OpenAI answers instead.
+import sys
+import glob
+import time
+import asyncio
+import tempfile
+from itertools import product
+
+from app.config import Config
+from app.services.llm_providers import FakeProvider, create_llm_provider, set_llm_provider
+from app.services.policy_matcher import (create_vectorstore, load_vectorstore, extract_text_from_pdf,
+                                         segment_clauses, evaluate_clauses)
+from app.services.rejections_vectorstore import load_rejections_vectorstore
+
+
+def run(clauses_per_document: list, policy_coll, rejections_coll) -> tuple:
+    """(seconds, clauses/s, degraded results) of evaluating every document."""
+    start = time.perf_counter()
+    failures = 0
+    for clauses in clauses_per_document:
+        results = asyncio.run(evaluate_clauses(clauses, policy_coll, rejections_coll))
+        failures += sum(bool(result["llm_evaluation"].get("degraded")) for result in results)
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(map(len, clauses_per_document)) / elapsed, failures
+
+
+if __name__ == "__main__":
+    pdf_paths = sys.argv[1:] or sorted(glob.glob("examples/*.pdf"))
+    Config.EVALUATION_CACHE = ""
+    Config.FAST_PATH = False
+    # Keep the retries of fake rate limits short
+    Config.OPENAI_RETRY_BASE_DELAY = 0.1
+    clauses_per_document = [segment_clauses(extract_text_from_pdf(pdf_path)) for pdf_path in pdf_paths]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        create_vectorstore(Config.POLICY_RULES_PATH, persist_dir=tmp)
+        policy_coll = load_vectorstore(tmp)
+        rejections_coll = load_rejections_vectorstore()
+
+        print(f"{sum(map(len, clauses_per_document))} clauses from {len(pdf_paths)} documents")
+        if Config.LLM_RECORD_MODE == "replay":
+            set_llm_provider(create_llm_provider())
+            elapsed, throughput, failures = run(clauses_per_document, policy_coll, rejections_coll)
+            print(f"replay: {elapsed:.2f}s, {throughput:.1f} clauses/s, {failures} failed")
+            sys.exit()
+
+        print(f"{'latency':>8} {'errors':>7} {'concurrency':>12} {'seconds':>8} {'clauses/s':>10} {'failed':>7}")
+        for latency, error_rate, concurrency in product((0.2, 1.0), (0, 0.1), (4, 8, 16)):
+            set_llm_provider(FakeProvider(latency=latency, tokens_per_second=200, error_rate=error_rate))
+            Config.OPENAI_MAX_CONCURRENCY = concurrency
+            elapsed, throughput, failures = run(clauses_per_document, policy_coll, rejections_coll)
+            print(f"{latency:>8} {error_rate:>7} {concurrency:>12} {elapsed:>8.2f} {throughput:>10.1f} {failures:>7}")
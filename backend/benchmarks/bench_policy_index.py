@@ -0,0 +1,54 @@
+# Run using 'PYTHONPATH=backend python backend/benchmarks/bench_policy_index.py' in NDAI project root
+import time
+import tempfile
+
+import chromadb
+import numpy as np
+
+from app.services.policy_index import PolicyIndex
+
+DIM = 384  # all-MiniLM-L6-v2
+
+
+def random_unit_vectors(n: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def time_it(fn, repeat: int = 50) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    k, batch = 3, 30
+    # Chroma uses an approximate (HNSW) search, top-k may differ from the exact one on large rule sets
+    print(f"{'rules':>6} {'chroma (ms)':>12} {'numpy (ms)':>11} {'numpy mmap (ms)':>16} {'same top-k':>11}")
+    for rule_count in (17, 200, 2000):
+        rules = random_unit_vectors(rule_count, rng)
+        ids = [f"rule_{i}" for i in range(rule_count)]
+        docs = [f"Policy Rule {i}" for i in range(rule_count)]
+        metas = [{"id": i, "title": i, "severity": "high", "category": "test"} for i in ids]
+        queries = random_unit_vectors(batch, rng)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            collection = chromadb.PersistentClient(path=tmp).create_collection(
+                "policy_rules", configuration={"hnsw": {"space": "cosine"}}, embedding_function=None)
+            collection.add(ids=ids, documents=docs, metadatas=metas, embeddings=rules)
+            index = PolicyIndex.from_embeddings(rules, ids, docs, metas)
+            index.save(tmp)
+            mapped = PolicyIndex.load(tmp)
+
+            chroma_ids = collection.query(query_embeddings=queries, n_results=k)["ids"]
+            same = chroma_ids == index.query(query_embeddings=queries, n_results=k)["ids"] \
+                == mapped.query(query_embeddings=queries, n_results=k)["ids"]
+
+            chroma_time = time_it(lambda: collection.query(query_embeddings=queries, n_results=k))
+            numpy_time = time_it(lambda: index.query(query_embeddings=queries, n_results=k))
+            mmap_time = time_it(lambda: mapped.query(query_embeddings=queries, n_results=k))
+        print(f"{rule_count:>6} {chroma_time * 1e3:>12.3f} {numpy_time * 1e3:>11.3f} {mmap_time * 1e3:>16.3f} {str(same):>11}")
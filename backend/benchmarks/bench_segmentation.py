@@ -0,0 +1,53 @@
+# Run using 'PYTHONPATH=backend python backend/benchmarks/bench_segmentation.py' in NDAI project root
+import random
+import time
+
+from app.services.policy_matcher import segment_clauses, IncrementalClauseSegmenter
+
+WORDS = ["Recipient", "shall", "not", "disclose", "any", "Confidential", "Information", "to", "third", "parties",
+         "without", "the", "prior", "written", "consent", "of", "Discloser", "and", "Agreement", "Party"]
+
+
+def synthetic_pages(page_count: int, clauses_per_page: int = 3, lines_per_clause: int = 12, seed: int = 0):
+    """Pages of a long NDA: numbered clause titles followed by body lines, some clauses spanning pages."""
+    rng = random.Random(seed)
+    pages, clause_number = [], 0
+    for page_number in range(1, page_count + 1):
+        lines = []
+        for _ in range(clauses_per_page):
+            clause_number = clause_number % 99 + 1
+            lines.append(f"{clause_number}. {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}")
+            for _ in range(rng.randint(1, lines_per_clause)):
+                lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+        pages.append({"page_number": page_number, "text": "\n".join(lines)})
+    return pages
+
+
+def time_it(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_incremental(pages):
+    segmenter = IncrementalClauseSegmenter()
+    clauses = []
+    for page in pages:
+        clauses.extend(segmenter.feed(page))
+    return clauses + segmenter.close()
+
+
+if __name__ == "__main__":
+    print(f"{'pages':>6} {'clauses':>8} {'batch (ms)':>11} {'µs/page':>8} {'incremental (ms)':>17} {'µs/page':>8}")
+    for page_count in (50, 100, 200, 400, 800, 1600):
+        pages = synthetic_pages(page_count)
+        clauses = segment_clauses(pages)
+        assert run_incremental(pages) == clauses
+
+        batch = time_it(lambda: segment_clauses(pages))
+        incremental = time_it(lambda: run_incremental(pages))
+        print(f"{page_count:>6} {len(clauses):>8} {batch * 1e3:>11.2f} {batch / page_count * 1e6:>8.1f} "
+              f"{incremental * 1e3:>17.2f} {incremental / page_count * 1e6:>8.1f}")
@@ -0,0 +1,56 @@
+# Run using 'PYTHONPATH=backend python backend/benchmarks/bench_storage.py [pdfs...]' in NDAI project root
+# Upload path of analyzed documents (PDF and JSON report) against a local storage with simulated round trips:
+# one upload after the other, as analyze used to, vs both at once on the storage threads (upload_many).
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import tempfile
+
+from app.services.storage import LocalStorage
+
+
+def copies(pdf_paths: list, tmp: str) -> list:
+    """(pdf, report) local files of every document, as finalize_report leaves them."""
+    files = []
+    for i, pdf_path in enumerate(pdf_paths):
+        pdf_copy = os.path.join(tmp, f"{i}_{os.path.basename(pdf_path)}")
+        shutil.copyfile(pdf_path, pdf_copy)
+        report_path = f"{pdf_copy}_report.json"
+        with open(report_path, "w") as f:
+            json.dump({"filename": pdf_path, "analysis": [{"clause": "x" * 2000}] * 20}, f)
+        files.append((pdf_copy, report_path))
+    return files
+
+
+def sequential(storage: LocalStorage, files: list) -> float:
+    start = time.perf_counter()
+    for pdf_path, report_path in files:
+        name = os.path.basename(pdf_path)
+        storage.upload(pdf_path, f"pdfs/{name}")
+        storage.upload(report_path, f"reports/{name}_report.json")
+    return time.perf_counter() - start
+
+
+def concurrent(storage: LocalStorage, files: list) -> float:
+    start = time.perf_counter()
+    for pdf_path, report_path in files:
+        name = os.path.basename(pdf_path)
+        storage.upload_many([(pdf_path, f"pdfs/{name}"), (report_path, f"reports/{name}_report.json")],
+                            cleanup=True)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    pdf_paths = sys.argv[1:] or sorted(glob.glob("examples/*.pdf"))
+    print(f"{'latency':>8} {'sequential ms/doc':>18} {'upload_many ms/doc':>19}")
+    for latency in (0.0, 0.02, 0.1):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as root:
+            storage = LocalStorage(root, latency=latency)
+            files = copies(pdf_paths, tmp)
+            before = sequential(storage, files)
+            after = concurrent(storage, files)
+            assert not os.listdir(tmp), "uploaded local files are deleted"
+        print(f"{latency:>8} {before * 1000 / len(files):>18.1f} {after * 1000 / len(files):>19.1f}")
@@ -0,0 +1,68 @@
+# Run using 'PYTHONPATH=backend python backend/benchmarks/eval_fast_path.py [reports...]' in NDAI project root
+# Offline agreement of the rule-decided fast path with the LLM: the clauses of analysis reports (as written to
+# REPORT_FOLDER by /analyze) are classified again for a grid of thresholds, and each decision is compared with
+# the LLM evaluation stored in the report.
+import sys
+import glob
+import json
+import os
+import tempfile
+from itertools import product
+
+from app.config import Config
+from app.services.embeddings import get_embedding_service
+from app.services.keyword_index import KeywordIndex
+from app.services.policy_matcher import Clause, create_vectorstore, load_vectorstore, retrieve_policy_rules_batch
+from app.services.rule_classifier import FastPathThresholds, RuleClassifier
+
+
+def llm_evaluated_clauses(report_paths: list) -> list:
+    """(Clause, LLM evaluation) pairs of the reports, skipping failed and rule-decided evaluations."""
+    pairs = []
+    for path in report_paths:
+        with open(path, "r") as f:
+            report = json.load(f)
+        for result in report.get("analysis", []):
+            evaluation = result.get("llm_evaluation", {})
+            if result.get("decided_by") == "classifier" or evaluation.get("best_rule") == "Parsing Error":
+                continue
+            clause = result["clause"]
+            pairs.append((Clause(clause["title"], clause["body"], clause["pages"]), evaluation))
+    return pairs
+
+
+if __name__ == "__main__":
+    report_paths = sys.argv[1:] or sorted(glob.glob(os.path.join(Config.REPORT_FOLDER, "*_report.json")))
+    pairs = llm_evaluated_clauses(report_paths)
+    if not pairs:
+        sys.exit(f"No LLM evaluated clauses found in {report_paths or Config.REPORT_FOLDER}")
+    clauses = [clause for clause, _ in pairs]
+
+    embedding_service = get_embedding_service()
+    with tempfile.TemporaryDirectory() as tmp:
+        create_vectorstore(Config.POLICY_RULES_PATH, persist_dir=tmp)
+        embeddings = embedding_service.embed([str(clause) for clause in clauses])
+        batch_rules = retrieve_policy_rules_batch(clauses, load_vectorstore(tmp), query_embeddings=embeddings,
+                                                  keyword_index=KeywordIndex.load(tmp))
+    classifier = RuleClassifier.from_file(Config.POLICY_RULES_PATH, embedding_service)
+    similarities = [classifier.example_similarities(embedding) for embedding in embeddings]
+
+    print(f"{len(pairs)} LLM evaluated clauses from {len(report_paths)} reports")
+    print(f"{'compliant':>10} {'non_compl.':>10} {'anti_kw':>8} {'margin':>7} "
+          f"{'decided':>8} {'same status':>12} {'same rule':>10}")
+    for compliant, non_compliant, anti_keyword, margin in product((0.8, 0.85, 0.9, 0.95), (0.8, 0.85, 0.9, 0.95),
+                                                                  (0.7, 0.8), (0.05, 0.1)):
+        thresholds = FastPathThresholds(compliant, non_compliant, anti_keyword, margin)
+        decided = same_status = same_rule = 0
+        for (_, evaluation), clause_similarities, rules in zip(pairs, similarities, batch_rules):
+            decision = classifier.decide(clause_similarities, rules, thresholds)
+            if decision is None:
+                continue
+            decision, _ = decision
+            decided += 1
+            same_status += decision["status"] == evaluation.get("status")
+            same_rule += decision["best_rule"] == evaluation.get("best_rule")
+        agreement = f"{same_status / decided:.1%}" if decided else "-"
+        rule_agreement = f"{same_rule / decided:.1%}" if decided else "-"
+        print(f"{compliant:>10} {non_compliant:>10} {anti_keyword:>8} {margin:>7} "
+              f"{decided / len(pairs):>8.1%} {agreement:>12} {rule_agreement:>10}")
@@ -0,0 +1,45 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from app.config import Config
+from app.services.embedding_backends import ONNX_MODEL_FILE, ONNX_QUANTIZED_MODEL_FILE, create_encoder
+
+# Same bar as benchmarks/bench_embedding_backends.py: below this, retrieval results are likely to change
+MIN_COSINE_SIMILARITY = 0.98
+POLICY_RULES_PATH = os.path.join(os.path.dirname(__file__), "..", "policyRules.json")
+
+
+def policy_texts() -> list:
+    with open(POLICY_RULES_PATH, "r") as f:
+        rules = json.load(f)
+    texts = []
+    for rule in rules:
+        texts.append(f"{rule['title']}. {rule['compliance']} {rule['preferred']}")
+        texts.extend(example for example in rule.get("examples", {}).values() if example)
+    return texts
+
+
+def test_onnx_backend_rejects_other_models():
+    with pytest.raises(ValueError, match="onnx"):
+        create_encoder("sentence-transformers/all-mpnet-base-v2", "onnx")
+
+
+def test_onnx_matches_torch():
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    pytest.importorskip("sentence_transformers")
+    if not any(os.path.exists(os.path.join(Config.ONNX_MODEL_DIR, name))
+               for name in (ONNX_QUANTIZED_MODEL_FILE, ONNX_MODEL_FILE)):
+        pytest.skip(f"No ONNX export in {Config.ONNX_MODEL_DIR} (python -m app.services.embedding_backends)")
+
+    texts = policy_texts()
+    torch_vectors = np.asarray(create_encoder(Config.EMBEDDING_MODEL, "torch")(texts), dtype=np.float32)
+    onnx_vectors = np.asarray(create_encoder(Config.EMBEDDING_MODEL, "onnx")(texts), dtype=np.float32)
+    torch_vectors /= np.linalg.norm(torch_vectors, axis=1, keepdims=True)
+    onnx_vectors /= np.linalg.norm(onnx_vectors, axis=1, keepdims=True)
+
+    cosines = (torch_vectors * onnx_vectors).sum(axis=1)
+    assert cosines.min() >= MIN_COSINE_SIMILARITY
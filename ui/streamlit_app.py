@@ -1,6 +1,7 @@
 import json
 import os
 import time
+import uuid
 import requests
 import pandas as pd
 import streamlit as st
@@ -13,6 +14,8 @@ st.set_page_config(page_title="NDA Analyzer", layout="wide")
 
 # ---------------------------- Config ----------------------------
 API_BASE = os.getenv("API_BASE")
+# Stream clause results while the NDA is analyzed (POST /analyze?stream=true) instead of polling a job
+STREAM_ANALYSIS = os.getenv("STREAM_ANALYSIS", "true").lower() == "true"
 
 
 
@@ -20,6 +23,8 @@ API_BASE = os.getenv("API_BASE")
 st.session_state.setdefault("analysis", None)
 st.session_state.setdefault("selected_doc_id", None)
 st.session_state.setdefault("chat_thread", [])
+# Server side chat sessions: one per clause in the Analysis tab, one for the Chat tab thread
+st.session_state.setdefault("chat_session_ids", {})
 st.session_state.setdefault("selected_clause", None)
 
 
@@ -77,15 +82,28 @@ def load_document_details(doc_id):
     return None
 
 
-def call_chat(question, clause):
+def chat_session_id(key):
+    return st.session_state["chat_session_ids"].setdefault(key, str(uuid.uuid4()))
+
+
+def chat_body(question, clause, session_id=None):
     body = {"question": question}
-    if clause:
+    if clause and clause.get("id") is not None:
+        # Stored clause: the backend loads its context and keeps the conversation
+        body["clause_id"] = clause["id"]
+        body["session_id"] = session_id
+    elif clause:
         body["clause"] = clause.get("body", "")
         pred = clause.get("prediction")
         status = pred.get("status") or "NEEDS REVIEW"
         body["status"] = status
         reason = pred.get("reason")
         body["reason"] = reason
+    return body
+
+
+def call_chat(question, clause, session_id=None):
+    body = chat_body(question, clause, session_id)
     try:
         res = requests.post(f"{API_BASE}/chat", json=body, timeout=120)
         if res.ok:
@@ -96,28 +114,150 @@ def call_chat(question, clause):
         return f"(Chat unavailable) {e}"
 
 
+def stream_chat(question, clause, session_id=None):
+    """POST /chat/stream, yields the answer tokens as the server sends them (server-sent events)."""
+    try:
+        with requests.post(f"{API_BASE}/chat/stream", json=chat_body(question, clause, session_id), stream=True,
+                           timeout=(10, 120)) as res:
+            if not res.ok:
+                yield f"(Chat API error {res.status_code})"
+                return
+            event = None
+            for line in res.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "done":
+                        return
+                    if event == "error":
+                        yield f"(Chat error) {data.get('error')}"
+                        return
+                    yield data.get("token", "")
+                elif not line:
+                    event = None
+    except Exception as e:
+        yield f"(Chat unavailable) {e}"
+
+
+ANALYSIS_STAGES = {
+    "queued": "Waiting for a worker",
+    "starting": "Starting",
+    "extracting": "Extracting text and clauses",
+    "evaluating": "Evaluating clauses",
+    "scoring": "Scoring",
+    "uploading": "Uploading files",
+    "saving": "Saving results",
+    "done": "Done",
+}
+
+
+def analysis_progress(job) -> int:
+    """Percentage shown for a job: clause evaluation counts for most of the work."""
+    progress = job.get("progress") or {}
+    found, evaluated = progress.get("clauses_found") or 0, progress.get("clauses_evaluated") or 0
+    if job.get("stage") in ("queued", "starting"):
+        return 2
+    if job.get("stage") in ("extracting", "evaluating"):
+        return 5 + (85 * evaluated // found if found else 0)
+    return 95 if job.get("status") != "done" else 100
+
+
 def analyze_pdf(uploaded_file) -> dict:
-    """POST /analyze with the uploaded PDF. Returns JSON or raises."""
+    """POST /analyze with the uploaded PDF, then polls the analysis job until it is done. Returns JSON or raises."""
     files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
-    # Simulate progress while request is in flight
     prog = st.progress(0)
     t0 = time.time()
     try:
-        # We emulate upload progress by ticking while waiting; Cloud Run won't stream progress
-        for i in range(10):
-            prog.progress(min(95, (i + 1) * 9))
-            time.sleep(2)
         res = requests.post(f"{API_BASE}/analyze", files=files, timeout=900)
         if not res.ok:
             raise RuntimeError(f"HTTP {res.status_code}: {res.text}")
-        data = res.json()
-        prog.progress(100)
-        return data
+        if res.status_code != 202:
+            # Backend without background jobs: the report is the response
+            prog.progress(100)
+            return res.json()
+
+        status_url = f"{API_BASE}{res.json()['status_url']}"
+        while True:
+            job = requests.get(status_url, timeout=30).json()
+            progress = job.get("progress") or {}
+            text = ANALYSIS_STAGES.get(job.get("stage"), job.get("stage"))
+            if progress.get("clauses_found"):
+                text += f" ({progress.get('clauses_evaluated', 0)}/{progress['clauses_found']} clauses)"
+            prog.progress(analysis_progress(job), text=text)
+            if job.get("status") == "done":
+                return job["report"]
+            if job.get("status") == "failed":
+                raise RuntimeError(job.get("error") or "Analysis failed")
+            time.sleep(1)
     finally:
         elapsed = time.time() - t0
         st.caption(f"⏱️ Elapsed: {elapsed:.1f}s")
 
 
+def stored_document_id(data: dict) -> int | None:
+    """document_id of an analysis, waiting for its storage when the backend stores it in the background."""
+    persistence = data.get("persistence") or {}
+    if persistence.get("status") == "failed":
+        st.warning(f"⚠️ The analysis could not be saved: {persistence.get('error')}")
+    if data.get("document_id") or persistence.get("status") != "pending":
+        return data.get("document_id")
+    for _ in range(30):
+        job = requests.get(f"{API_BASE}{persistence['status_url']}", timeout=30).json()
+        if job.get("status") == "done":
+            return job.get("document_id")
+        if job.get("status") == "failed":
+            st.warning(f"⚠️ The analysis could not be saved: {job.get('error')}")
+            return None
+        time.sleep(1)
+    return None
+
+
+def iter_analysis_records(uploaded_file):
+    """POST /analyze?stream=true with the uploaded PDF, yields the NDJSON records as the server sends them."""
+    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
+    with requests.post(f"{API_BASE}/analyze", params={"stream": "true"}, files=files, stream=True,
+                       timeout=(30, 900)) as res:
+        if not res.ok:
+            raise RuntimeError(f"HTTP {res.status_code}: {res.text}")
+        for line in res.iter_lines(decode_unicode=True):
+            if line:
+                yield json.loads(line)
+
+
+def stream_analysis(uploaded_file, container) -> dict:
+    """
+    Renders the clauses in container as they are evaluated. Returns the summary record with the streamed clauses
+    as its "analysis" (in document order, like a report), or raises.
+    """
+    container.subheader(f"⏳ Live analysis — {uploaded_file.name}")
+    status_line = container.empty()
+    table = container.empty()
+    rows, clauses = {}, {}
+    t0 = time.time()
+    for record in iter_analysis_records(uploaded_file):
+        if record["type"] == "clause":
+            clauses[record["index"]] = {key: value for key, value in record.items() if key not in ("type", "index")}
+            evaluation = record.get("llm_evaluation") or {}
+            rows[record["index"]] = {
+                "#": record["index"] + 1,
+                "title": record["clause"].get("title"),
+                "status": evaluation.get("status", "NEEDS_REVIEW"),
+                "severity": evaluation.get("severity", "medium"),
+                "pages": ", ".join(map(str, record["clause"].get("pages", []))),
+            }
+            # Clauses arrive as they are evaluated, they are shown in document order
+            table.dataframe(pd.DataFrame([rows[i] for i in sorted(rows)]), hide_index=True, use_container_width=True)
+            status_line.caption(f"{len(rows)} clauses evaluated — {time.time() - t0:.1f}s")
+        elif record["type"] == "error":
+            raise RuntimeError(record["error"])
+        elif record["type"] == "summary":
+            score = (record.get("compliance") or {}).get("compliance_score")
+            status_line.caption(f"✅ {len(rows)} clauses evaluated in {time.time() - t0:.1f}s — compliance score {score}")
+            return {**record, "analysis": [clauses[i] for i in sorted(clauses)]}
+    raise RuntimeError("The analysis stream ended before its summary.")
+
+
 # --------------------------- UI Tabs ----------------------------
 tabs = st.tabs(["📂 NDAs", "📊 Analysis", "💬 NDA Chat", "⚙️ Admin"])
 
@@ -129,8 +269,17 @@ with tabs[0]:
     if uploaded and st.button("Analyze PDF", type="primary"):
         with st.spinner("Analyzing on Cloud Run..."):
             try:
-                data = analyze_pdf(uploaded)
-                st.session_state["analysis"] = data
+                if STREAM_ANALYSIS:
+                    st.caption("Clauses appear in the Analysis tab as they are evaluated.")
+                    with tabs[1]:
+                        live = st.container()
+                    data = stream_analysis(uploaded, live)
+                else:
+                    data = analyze_pdf(uploaded)
+                # The Analysis tab shows stored documents
+                document_id = stored_document_id(data)
+                doc = load_document_details(document_id) if document_id else None
+                st.session_state["analysis"] = doc or data
                 st.success(f"✅ Analysis complete — {data.get('total_clauses', 0)} clauses found")
             except Exception as e:
                 st.error(f"Upload failed: {e}")
@@ -261,6 +410,8 @@ with tabs[1]:
                 f"<div style='background:{bg};color:{color};padding:10px;border-radius:8px'>{reason_text}</div>",
                 unsafe_allow_html=True,
             )
+            if pred.get("decided_by") == "classifier":
+                st.caption("⚡ Rule-decided: matched a policy rule example, the LLM was not called.")
             if pred.get("retrieved_rules"):
                 st.markdown("**Retrieved Matching Policy Rules:**")
                 for r in pred["retrieved_rules"]:
@@ -309,9 +460,7 @@ with tabs[1]:
                 st.write(prompt)
 
             with st.chat_message("assistant"):
-                with st.spinner("Analyzing..."):
-                    answer = call_chat(prompt, clause)
-                    st.write(answer)
+                answer = st.write_stream(stream_chat(prompt, clause, chat_session_id(f"clause-{clause_id}")))
 
             st.session_state["chat_history"][clause_id].append({"role": "assistant", "content": answer})
 
@@ -335,9 +484,7 @@ with tabs[2]:
     if user_q:
         st.session_state["chat_thread"].append({"role": "user", "content": user_q})
         with st.chat_message("assistant"):
-            with st.spinner("Thinking…"):
-                answer = call_chat(user_q, clause)
-                st.write(answer)
+            answer = st.write_stream(stream_chat(user_q, clause, chat_session_id("thread")))
         st.session_state["chat_thread"].append({"role": "assistant", "content": answer})
 
 # --------------------------- Tab 3: Admin ---------------------